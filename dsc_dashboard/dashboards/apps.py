@@ -1,3 +1,5 @@
+import sys
+
 from django.apps import AppConfig
 
 
@@ -6,5 +8,9 @@ class DashboardsConfig(AppConfig):
     name = 'dashboards'
 
     def ready(self):
+        # os comandos do manage.py não servem dashboards, só o runserver
+        if sys.argv[0].endswith('manage.py') and 'runserver' not in sys.argv:
+            return
+
         from data_updater import updater
-        updater.start()
\ No newline at end of file
+        updater.start()
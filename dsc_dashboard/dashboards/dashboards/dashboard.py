@@ -11,8 +11,9 @@ from .apps import app_1, app_2, app_3, app_4, app_5, app_6
 from data_updater.data_processing.processed_data import ProcessedData
 
 try:
+    # a primeira chamada do processo calcula todos os setores, depois só os sujos, veja updater.start
     processed_data = ProcessedData()
-    processed_data.get_processed_data_all()
+    processed_data.get_processed_data_dirty()
     diretoria = processed_data.get_data_diretoria()
     conectividade = processed_data.get_data_conectividade()
     sistemas = processed_data.get_data_sistemas()
@@ -65,8 +66,10 @@ try:
         Build the updated layout.
 
         Be a callback function triggered by the ``dcc.Interval`` component,
-        then call :func:`get_data` to compute the input values of the 
-        charts, and build the updated layout of the Dash application.
+        then read the processed data of the sectors, kept up to date by
+        :meth:`ProcessedData.get_processed_data_dirty` every minute, see
+        :func:`updater.start`, and build the updated layout of the Dash
+        application. No sector is recomputed here.
 
         Parameters
         ----------
@@ -79,8 +82,6 @@ try:
         list of dbc.Tabs
             Return a list of dbc.Tabs components to insert on html.Div.
         """
-        processed_data = ProcessedData()
-        processed_data.get_processed_data_all()
         diretoria = processed_data.get_data_diretoria()
         conectividade = processed_data.get_data_conectividade()
         sistemas = processed_data.get_data_sistemas()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from data_updater import ticket_archive
+
+class Command(BaseCommand):
+    """
+    Move the old closed tickets to the archive.
+
+    Move the tickets closed before the archive horizon out
+    of the Ticket table, see
+    :func:`data_updater.ticket_archive.archive_tickets`.
+    """
+    help = "Moves the tickets closed before the archive horizon to the ArchivedTicket table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Age of the close date, by default TICKET_ARCHIVE_DAYS")
+
+    def handle(self, *args, **options):
+        amount = ticket_archive.archive_tickets(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(str(amount) + " tickets archived!"))
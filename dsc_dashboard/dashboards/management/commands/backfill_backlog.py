@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from data_updater import backlog
+from tickets.models import BacklogSnapshot
+
+class Command(BaseCommand):
+    """
+    Build the backlog snapshots of the past days.
+
+    Compute the daily backlog of every group and state from
+    the ticket state history, see
+    :func:`data_updater.backlog.backfill_backlog`.
+    """
+    help = "Builds the daily backlog snapshots of the past days from the ticket state history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help="Replace the snapshots already taken")
+        parser.add_argument('--if-empty', action='store_true', help="Only build the snapshots when there is none")
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and BacklogSnapshot.objects.exists():
+            self.stdout.write(self.style.SUCCESS("The backlog snapshots are already built!"))
+            return
+        days = backlog.backfill_backlog(overwrite=options['overwrite'])
+        self.stdout.write(self.style.SUCCESS(str(days) + " days of backlog snapshots written!"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from data_updater import backfill
+
+class Command(BaseCommand):
+    """
+    Fill the database with all Zammad tickets.
+
+    Fetch the ticket pages in partitions spread over a pool
+    of processes, resuming the unfinished partitions of a
+    previous run, see :func:`data_updater.backfill.backfill`.
+    """
+    help = "Fetches all Zammad tickets in parallel partitions, resuming an interrupted backfill"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Number of processes, defaults to the number of cores")
+        parser.add_argument('--pages-per-partition', type=int, default=backfill.DEFAULT_PAGES_PER_PARTITION,
+                            help="Number of Zammad pages of each partition")
+        parser.add_argument('--restart', action='store_true', help="Discard the unfinished backfill")
+
+    def handle(self, *args, **options):
+        counts = backfill.backfill(workers=options['workers'],
+                                   pages_per_partition=options['pages_per_partition'],
+                                   restart=options['restart'])
+        self.stdout.write(self.style.SUCCESS(str(sum(counts.values())) + " tickets fetched, "
+                                             + str(counts['created']) + " created and "
+                                             + str(counts['changed']) + " changed!"))
@@ -0,0 +1,232 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from data_updater.ticket_rollup import rollup_contributions
+from data_updater.data_processing.constant_utils import ZAMMAD_GROUPS_TO_STD_SECTORS, SECTOR_REGISTRY
+from data_updater.data_processing.refresh_context import LEADTIME_DAYS, RefreshContext
+from data_updater.data_processing.diretoria import LEADTIME_SECTORS, LEADTIME_CAMPI
+
+# grupos dos tickets sintéticos, os mesmos dos gráficos de leadtime da diretoria
+GROUPS = list(ZAMMAD_GROUPS_TO_STD_SECTORS)
+
+# nomes dos setores e campi no gráfico antigo da diretoria
+LEGACY_SECTORS = ["Sistemas", "Suporte ao Usuário", "Serviços Computacionais", "Micro Informática", "Conectividade",
+                  "CODAI", "UABJ", "UAST", "UACSA", "UAEADTec"]
+
+
+def synthetic_tickets(amount, seed=0):
+    """
+    Build closed tickets with random groups and leadtimes.
+
+    Parameters
+    ----------
+    amount : int
+        Number of tickets.
+    seed : int, optional
+        Seed of the random generator, the same seed gives
+        the same tickets.
+
+    Returns
+    -------
+    tickets : pd.DataFrame
+        Pandas Dataframe with the ``group``, ``created_at``,
+        ``close_at`` and ``leadtime_hours`` of the tickets, all
+        closed in the last ``LEADTIME_DAYS``.
+    """
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now(tz='UTC')
+    close_at = now - pd.to_timedelta(rng.uniform(0, LEADTIME_DAYS * 24, amount), unit='h')
+    leadtime_hours = rng.exponential(10 * 24, amount)
+    return pd.DataFrame({
+        'group': pd.Categorical.from_codes(rng.integers(0, len(GROUPS), amount), GROUPS),
+        'created_at': close_at - pd.to_timedelta(leadtime_hours, unit='h'),
+        'close_at': close_at,
+        'leadtime_hours': leadtime_hours,
+    })
+
+
+def synthetic_rollup(tickets):
+    """
+    Build the monthly rollup of the tickets, as :attr:`RefreshContext.rollup` reads it.
+
+    Parameters
+    ----------
+    tickets : pd.DataFrame
+        Tickets returned by :func:`synthetic_tickets`.
+
+    Returns
+    -------
+    rollup : pd.DataFrame
+        Pandas Dataframe with the ``group``, ``month`` and ``ROLLUP_COLUMNS``.
+    """
+    rows = pd.DataFrame({'group': tickets['group'].cat.codes, 'state': 1,
+                         'created_at': tickets['created_at'], 'close_at': tickets['close_at']})
+    rollup = rollup_contributions(rows, {'closed': 1}).reset_index()
+    rollup['group'] = pd.Categorical(rollup['group'].map(dict(enumerate(GROUPS))))
+    rollup['month'] = rollup['month'].dt.to_period('M')
+    return rollup
+
+
+def legacy_leadtime(scatter):
+    """
+    Build the leadtime tables of the Diretoria row by row.
+
+    The implementation replaced by :meth:`SectorEngine.leadtime`,
+    kept only to be compared with it.
+
+    The mean is taken over the whole hours of the tickets and
+    then truncated to days, over the tickets closed in the last
+    ``LEADTIME_DAYS``.
+
+    Parameters
+    ----------
+    scatter : pd.DataFrame
+        Pandas Dataframe with the ``close_at``, the standard sector,
+        ``group``, and the leadtime in whole hours, ``diff``, of each ticket.
+
+    Returns
+    -------
+    leadtime_std_sectors : pd.DataFrame
+        Mean leadtime of each sector in each month.
+    leadtime_campi : pd.DataFrame
+        Mean leadtime of each campus in each month.
+    """
+    tickets_aux = pd.DataFrame(columns=['mes/ano', 'group', 'diff'])
+    for i in range(0, len(scatter['diff'])):
+        tickets_aux.loc[i] = [scatter['close_at'].iloc[i].date().strftime('%y-%m'), scatter['group'].iloc[i], scatter['diff'].iloc[i]]
+
+    tickets_aux = tickets_aux.groupby(['mes/ano', 'group']).mean().reset_index()
+    tickets_aux['diff'] = tickets_aux['diff']/24
+    tickets_aux['diff'] = tickets_aux['diff'].astype(int)
+
+    for mes in tickets_aux['mes/ano']:
+        for setor in LEGACY_SECTORS:
+            if setor not in tickets_aux[(tickets_aux['mes/ano'] == mes)]['group'].to_list():
+                tickets_aux = pd.concat([tickets_aux, pd.DataFrame({"mes/ano": [mes], "group": [setor], "diff": [0]})], ignore_index=True)
+
+    tickets_aux = tickets_aux.sort_values(by='mes/ano').reset_index(drop=True)
+
+    leadtime_std_sectors = tickets_aux.loc[tickets_aux['group'].isin(LEGACY_SECTORS[:5])]
+    leadtime_campi = tickets_aux.loc[tickets_aux['group'].isin(LEGACY_SECTORS[5:])]
+    leadtime_std_sectors = leadtime_std_sectors.pivot_table('diff', 'mes/ano', 'group').reset_index(level=[0])
+    leadtime_campi = leadtime_campi.pivot_table('diff', 'mes/ano', 'group').reset_index(level=[0])
+    return leadtime_std_sectors, leadtime_campi
+
+
+def engine_leadtime(rollup, groups):
+    """
+    Build the leadtime table of the Diretoria with the :class:`SectorEngine`.
+
+    Parameters
+    ----------
+    rollup : pd.DataFrame
+        Rollup returned by :func:`synthetic_rollup`.
+    groups : list of str
+        Names of the Zammad groups.
+
+    Returns
+    -------
+    leadtime : pd.DataFrame
+        Mean leadtime of each sector and campus in each month.
+    """
+    # o contexto recebe as tabelas prontas, sem consultar o banco
+    context = RefreshContext()
+    context.groups = groups
+    context.rollup = rollup
+    since = (pd.Timestamp.now() - pd.Timedelta(days=LEADTIME_DAYS)).to_period('M')
+    return context.sectors.leadtime(LEADTIME_SECTORS + LEADTIME_CAMPI, since)
+
+
+def leadtime_differences(legacy, engine):
+    """
+    Compare the leadtime tables of both implementations.
+
+    The :class:`SectorEngine` takes the mean of the whole days
+    of the tickets, over whole months, while the row by row
+    implementation truncates the mean of the hours, so the
+    same month may differ by a day.
+
+    Parameters
+    ----------
+    legacy : tuple of pd.DataFrame
+        Tables returned by :func:`legacy_leadtime`.
+    engine : pd.DataFrame
+        Table returned by :func:`engine_leadtime`.
+
+    Returns
+    -------
+    cells : int
+        Number of months and sectors compared.
+    different : int
+        Number of them whose leadtime is not the same.
+    max_difference : int
+        Largest difference, in days.
+    """
+    legacy = legacy[0].merge(legacy[1], on='mes/ano', how='outer').set_index('mes/ano')
+    engine = engine.rename(columns={sector: SECTOR_REGISTRY[sector]['name'] for sector in LEADTIME_SECTORS})
+    engine.index = engine.index.strftime('%y-%m')
+
+    months = legacy.index.union(engine.index)
+    legacy = legacy.reindex(index=months, columns=LEGACY_SECTORS).fillna(0).astype(int)
+    engine = engine.reindex(index=months, columns=LEGACY_SECTORS).fillna(0).astype(int)
+    differences = (engine - legacy).abs()
+    return differences.size, int((differences > 0).sum().sum()), int(differences.max().max())
+
+
+class Command(BaseCommand):
+    """
+    Time the leadtime of the Diretoria on synthetic tickets.
+
+    Build closed tickets with a fixed seed, see
+    :func:`synthetic_tickets`, then time the row by row
+    implementation, :func:`legacy_leadtime`, and the
+    :class:`SectorEngine`, :func:`engine_leadtime`, for each
+    number of tickets. The rollup is built at ingest, see
+    :func:`data_updater.ticket_rollup.update_rollup`, its time
+    is shown apart. The months and sectors whose leadtime is
+    not the same in both are also shown, see
+    :func:`leadtime_differences`. The database is not used.
+    """
+    help = "Times the leadtime of the Diretoria, row by row and with the sector engine, on synthetic tickets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 20000, 50000, 100000, 500000],
+                            help="Numbers of tickets")
+        parser.add_argument('--legacy-max', type=int, default=100000,
+                            help="Largest number of tickets timed with the row by row implementation")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs of the sector engine, the best one is shown")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic tickets")
+
+    def handle(self, *args, **options):
+        groups = sorted(set(GROUPS + [group for entry in SECTOR_REGISTRY.values() for group in entry['groups'] or []]))
+        self.stdout.write("tickets;legacy_s;rollup_s;engine_s;cells;different_cells;max_difference_days")
+        for size in options['sizes']:
+            tickets = synthetic_tickets(size, options['seed'])
+
+            start = time.perf_counter()
+            rollup = synthetic_rollup(tickets)
+            rollup_seconds = time.perf_counter() - start
+
+            engine_seconds = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                engine = engine_leadtime(rollup, groups)
+                engine_seconds.append(time.perf_counter() - start)
+
+            legacy_seconds = '-'
+            differences = ['-', '-', '-']
+            if size <= options['legacy_max']:
+                scatter = pd.DataFrame({'close_at': tickets['close_at'],
+                                        'group': tickets['group'].map(ZAMMAD_GROUPS_TO_STD_SECTORS),
+                                        'diff': tickets['leadtime_hours'].astype(int)})
+                start = time.perf_counter()
+                legacy = legacy_leadtime(scatter)
+                legacy_seconds = format(time.perf_counter() - start, '.3f')
+                differences = leadtime_differences(legacy, engine)
+
+            self.stdout.write(str(size) + ";" + legacy_seconds + ";" + format(rollup_seconds, '.3f')
+                              + ";" + format(min(engine_seconds), '.4f')
+                              + "".join(";" + str(value) for value in differences))
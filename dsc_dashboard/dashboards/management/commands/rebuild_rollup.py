@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from data_updater import ticket_rollup
+
+class Command(BaseCommand):
+    """
+    Rebuild the monthly rollup of the tickets.
+
+    Recount the monthly totals of every group from the
+    tickets, see :func:`data_updater.ticket_rollup.rebuild_rollup`,
+    or only report how many of them are out of date.
+    """
+    help = "Rebuilds the monthly ticket rollup from the Ticket table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report the rows that do not match")
+
+    def handle(self, *args, **options):
+        mismatches = ticket_rollup.rebuild_rollup(check=options['check'])
+        if options['check'] and mismatches:
+            self.stdout.write(self.style.WARNING(str(mismatches) + " rollup rows do not match the tickets!"))
+        elif options['check']:
+            self.stdout.write(self.style.SUCCESS("The rollup matches the tickets!"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Rollup rebuilt, " + str(mismatches) + " rows were out of date!"))
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from data_updater import data_zammad
+
+class Command(BaseCommand):
+    """
+    Rebuild the tickets from the Zammad payload archive.
+
+    Store the tickets of the archived payloads without
+    requesting Zammad, see :func:`data_updater.data_zammad.replay`.
+    """
+    help = "Rebuilds the Ticket table from the archived Zammad payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help="First day of the archive (YYYY-MM-DD)")
+        parser.add_argument('--until', type=date.fromisoformat, help="Last day of the archive (YYYY-MM-DD)")
+        parser.add_argument('--truncate', action='store_true', help="Delete every ticket before the replay")
+
+    def handle(self, *args, **options):
+        counts = data_zammad.replay(since=options['since'], until=options['until'], truncate=options['truncate'])
+        self.stdout.write(self.style.SUCCESS(str(sum(counts.values())) + " tickets replayed, "
+                                             + str(counts['created']) + " created and "
+                                             + str(counts['changed']) + " changed!"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from data_updater import updater
+
+class Command(BaseCommand):
+    """
+    Run the Zammad sync scheduler.
+
+    Only the process holding the MySQL leader lock runs
+    the jobs, the others wait to replace it, see
+    :func:`data_updater.updater.run_scheduler`.
+    """
+    help = "Runs the Zammad sync jobs in a single process of the cluster"
+
+    def handle(self, *args, **options):
+        updater.run_scheduler()
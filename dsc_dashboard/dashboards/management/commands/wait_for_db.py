@@ -3,7 +3,7 @@ import time
 from django.db import connection
 from django.db.utils import OperationalError
 from django.core.management.base import BaseCommand
-from data_updater import data_zammad
+from data_updater import backfill
 from tickets.models import Ticket
 
 class Command(BaseCommand):
@@ -12,7 +12,8 @@ class Command(BaseCommand):
 
     Check if the database is up before starting the
     Django application, and fill the database using
-    the Zammad tickets' information.
+    the Zammad tickets' information, resuming an
+    interrupted backfill.
 
     Method
     ----------
@@ -41,8 +42,8 @@ class Command(BaseCommand):
         while tries < 10:
             try:
                 connection.ensure_connection()
-                if Ticket.objects.all().count() < 10:
-                    data_zammad.all_tickets()
+                if Ticket.objects.all().count() < 10 or backfill.pending():
+                    backfill.backfill()
                 break
             except OperationalError:
                 self.stdout.write('Database unavailable, waiting 1 second...')
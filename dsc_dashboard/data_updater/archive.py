@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytz
+from django.conf import settings
+
+FILE_PREFIX = 'zammad-'
+FILE_SUFFIX = '.jsonl.gz'
+
+
+def archive_dir():
+    """
+    Get the directory of the raw payload archive.
+
+    Returns
+    -------
+    directory : Path or None
+        The ``ZAMMAD_ARCHIVE_DIR`` setting, or None when
+        it is empty and the archive is disabled.
+    """
+    directory = getattr(settings, 'ZAMMAD_ARCHIVE_DIR', None)
+    return Path(directory) if directory else None
+
+
+def archive_payload(kind, payload, page=None):
+    """
+    Append a raw Zammad payload to the archive.
+
+    The payloads of each day (UTC) go to one JSON Lines
+    file. Each entry is compressed as a separate gzip member
+    and appended with a single write, so several processes
+    can share the file, and ``gzip`` reads the members back
+    as one stream.
+
+    Parameters
+    ----------
+    kind : str
+        Origin of the payload: ``tickets``, ``search``,
+        ``groups``, ``ticket_states`` or ``webhook``.
+    payload : dict or list
+        The decoded JSON response, as received from Zammad.
+    page : int, optional
+        Number of the page of the payload.
+    """
+    directory = archive_dir()
+    if directory is None:
+        return
+
+    now = datetime.now(pytz.UTC)
+    entry = {'kind': kind, 'page': page, 'fetched_at': now.isoformat(), 'payload': payload}
+    data = gzip.compress((json.dumps(entry, separators=(',', ':')) + '\n').encode())
+
+    os.makedirs(directory, exist_ok=True)
+    with open(directory / (FILE_PREFIX + now.strftime('%Y-%m-%d') + FILE_SUFFIX), 'ab', buffering=0) as archive:
+        archive.write(data)
+
+
+def archive_files(since=None, until=None):
+    """
+    List the archive files in chronological order.
+
+    Parameters
+    ----------
+    since : datetime.date, optional
+        First day to be listed.
+    until : datetime.date, optional
+        Last day to be listed.
+
+    Returns
+    -------
+    files : list of Path
+        The daily files inside the interval.
+    """
+    directory = archive_dir()
+    if directory is None or not directory.exists():
+        return []
+
+    files = []
+    for path in sorted(directory.glob(FILE_PREFIX + '*' + FILE_SUFFIX)):
+        day = datetime.strptime(path.name[len(FILE_PREFIX):-len(FILE_SUFFIX)], '%Y-%m-%d').date()
+        if (since is None or day >= since) and (until is None or day <= until):
+            files.append(path)
+    return files
+
+
+def read_archive(since=None, until=None):
+    """
+    Iterate over the archived payloads in the order they were written.
+
+    Parameters
+    ----------
+    since : datetime.date, optional
+        First day to be read.
+    until : datetime.date, optional
+        Last day to be read.
+
+    Yields
+    ------
+    entry : dict
+        The ``kind``, ``page``, ``fetched_at`` and ``payload``
+        given to :func:`archive_payload`.
+    """
+    for path in archive_files(since, until):
+        with gzip.open(path, 'rt') as archive:
+            for line in archive:
+                yield json.loads(line)
@@ -0,0 +1,159 @@
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections
+from django.db.utils import ProgrammingError
+
+from tickets.models import BackfillPartition, SyncWatermark
+from .data_processing.processed_data import SECTORS, mark_sectors_dirty
+from .zammad_client import ZammadClient, DEFAULT_MAX_WORKERS
+from . import data_zammad
+
+DEFAULT_PAGES_PER_PARTITION = 20
+
+
+def pending():
+    """
+    Tell if there is an unfinished backfill.
+
+    Returns
+    -------
+    bool
+        True when some partition has pages left to fetch.
+    """
+    try:
+        return BackfillPartition.objects.filter(done=False).exists()
+    except ProgrammingError:
+        # a tabela ainda não foi criada pelo migrate
+        return False
+
+
+def plan_partitions(client, pages_per_partition=DEFAULT_PAGES_PER_PARTITION):
+    """
+    Split the ticket pages of Zammad into partitions.
+
+    The number of pages is estimated from the greatest ticket
+    id, which is an upper bound of the number of tickets, so the
+    partitions cover every ticket that exists when the backfill
+    starts. The previous partitions are discarded.
+
+    Parameters
+    ----------
+    client : ZammadClient
+        Client used to access the Zammad API.
+    pages_per_partition : int, optional
+        Number of pages of each partition.
+
+    Returns
+    -------
+    partitions : list of BackfillPartition
+        The stored partitions.
+    """
+    last = client.get("/api/v1/tickets", {"sort_by": "id", "order_by": "desc", "per_page": 1, "page": 1})
+    total_pages = math.ceil(last[0]['id'] / data_zammad.PER_PAGE) if last else 0
+
+    BackfillPartition.objects.all().delete()
+    return BackfillPartition.objects.bulk_create([
+        BackfillPartition(first_page=first_page,
+                          last_page=min(first_page + pages_per_partition - 1, total_pages),
+                          next_page=first_page)
+        for first_page in range(1, total_pages + 1, pages_per_partition)
+    ])
+
+
+def backfill_partition(partition_id, max_workers=None):
+    """
+    Fetch and store the pages of a partition.
+
+    Start from the checkpointed ``next_page`` and move it
+    forward after each stored page, so an interrupted
+    partition loses at most the pages in flight.
+
+    Parameters
+    ----------
+    partition_id : int
+        Primary key of the BackfillPartition.
+    max_workers : int, optional
+        Maximum number of requests in flight of this partition.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    partition = BackfillPartition.objects.get(pk=partition_id)
+    counts = Counter()
+    with ZammadClient(max_workers=max_workers) as client:
+        for page, records in data_zammad.all_pages(client, partition.next_page, partition.last_page):
+            if records:
+                counts += data_zammad.save_tickets(records)
+
+            partition.next_page = page + 1
+            partition.save(update_fields=['next_page'])
+            print("[GETTING PAGE: " + str(page) + "]")
+
+    partition.done = True
+    partition.save(update_fields=['done'])
+    return counts
+
+
+def _close_connections():
+    # cada processo abre a sua própria conexão com o banco
+    connections.close_all()
+
+
+def backfill(workers=None, pages_per_partition=DEFAULT_PAGES_PER_PARTITION, restart=False):
+    """
+    Get all tickets from Zammad in parallel partitions.
+
+    Split the ticket pages into partitions, see :func:`plan_partitions`,
+    and fetch them in a pool of processes, see :func:`backfill_partition`.
+    When a previous backfill is unfinished, only its pending
+    partitions are fetched. At the end, the sync watermark is
+    moved back to the start of the backfill, so the tickets
+    changed meanwhile are fetched by :func:`data_zammad.updated_tickets`,
+    and every sector is marked as dirty.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes, defaults to the number of cores.
+    pages_per_partition : int, optional
+        Number of pages of each new partition.
+    restart : bool, optional
+        Discard the unfinished backfill and start a new one.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_workers = max(1, int(os.getenv("ZAMMAD_MAX_WORKERS", DEFAULT_MAX_WORKERS)) // workers)
+
+    if restart or not pending():
+        with ZammadClient() as client:
+            plan_partitions(client, pages_per_partition)
+
+    partition_ids = list(BackfillPartition.objects.filter(done=False).values_list('pk', flat=True))
+    print('BACKFILLING ' + str(len(partition_ids)) + ' PARTITIONS WITH ' + str(workers) + ' PROCESSES...')
+
+    counts = Counter()
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_close_connections) as executor:
+        futures = [executor.submit(backfill_partition, partition_id, max_workers) for partition_id in partition_ids]
+        for future in as_completed(futures):
+            counts += future.result()
+    print('ENDED BACKFILLING ' + str(sum(counts.values())) + ' TICKETS, ' + str(counts['created']) + ' CREATED AND '
+          + str(counts['changed']) + ' CHANGED...')
+
+    watermark = data_zammad.reset_watermark()
+    started_at = BackfillPartition.objects.order_by('started_at').values_list('started_at', flat=True).first()
+    if watermark is not None and started_at is not None and started_at < watermark.updated_at:
+        SyncWatermark.objects.filter(pk=watermark.pk).update(updated_at=started_at, last_id=0)
+
+    mark_sectors_dirty(SECTORS)
+
+    return counts
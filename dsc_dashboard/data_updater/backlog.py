@@ -0,0 +1,141 @@
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count
+
+from tickets.models import Ticket, ArchivedTicket, TicketStateChange, TicketState, BacklogSnapshot
+from .ticket_archive import archived_state_changes
+from .data_processing.state_history import CLOSED_STATES, state_intervals, daily_backlog_by
+
+# estado, antes de fechar, dos tickets fechados sem histórico de estados
+UNKNOWN_STATE = ''
+
+
+def snapshot_backlog(date=None):
+    """
+    Take the snapshot of the backlog of a day.
+
+    Count the tickets of each group and state that are not in
+    one of the ``CLOSED_STATES``, replacing the snapshot of
+    the day if it was already taken.
+
+    Parameters
+    ----------
+    date : datetime.date, optional
+        Day of the snapshot, by default today (UTC).
+
+    Returns
+    -------
+    amount : int
+        Number of tickets in the backlog.
+    """
+    date = date or pd.Timestamp.now(tz='UTC').date()
+    counts = list(Ticket.objects.exclude(state__name__in=CLOSED_STATES).exclude(group=None)
+                  .values_list('group', 'state').annotate(amount=Count('id')))
+
+    with transaction.atomic():
+        BacklogSnapshot.objects.filter(date=date).delete()
+        BacklogSnapshot.objects.bulk_create([
+            BacklogSnapshot(date=date, group_id=group, state_id=state, amount=amount)
+            for group, state, amount in counts
+        ])
+
+    amount = sum(amount for _, _, amount in counts)
+    print("[", amount, "] Tickets in the backlog...")
+    return amount
+
+
+def backlog_intervals(tickets, changes):
+    """
+    Build the periods each ticket spent in each state and group.
+
+    The periods come from :func:`state_intervals`. A ticket closed
+    without state history was in an unknown state, ``UNKNOWN_STATE``,
+    from its creation until its ``close_at``.
+
+    Parameters
+    ----------
+    tickets : pd.DataFrame
+        Pandas Dataframe with the ``id``, ``group``, ``state``,
+        ``created_at`` and ``close_at`` of the tickets.
+    changes : pd.DataFrame
+        Pandas Dataframe with the ``ticket_id``, ``changed_at``,
+        ``from_state`` and ``to_state`` of the transitions.
+
+    Returns
+    -------
+    intervals : pd.DataFrame
+        Pandas Dataframe with the ``ticket_id``, ``group``,
+        ``state``, ``start`` and ``end`` of each period.
+    """
+    intervals = state_intervals(tickets, changes)
+
+    closed = tickets[tickets['state'].isin(CLOSED_STATES) & tickets['close_at'].notna()
+                     & ~tickets['id'].isin(changes['ticket_id'])]
+    unknown = intervals['ticket_id'].isin(closed['id'])
+    intervals.loc[unknown, 'state'] = UNKNOWN_STATE
+    intervals.loc[unknown, 'end'] = intervals.loc[unknown, 'ticket_id'].map(closed.set_index('id')['close_at'])
+
+    intervals['group'] = intervals['ticket_id'].map(tickets.set_index('id')['group'])
+    return intervals
+
+
+def backfill_backlog(overwrite=False):
+    """
+    Build the snapshots of the backlog of every past day.
+
+    Compute the backlog of each group and state on every day
+    until yesterday at once, from the periods of
+    :func:`backlog_intervals`, see :func:`daily_backlog_by`,
+    instead of one query per day. The archived tickets are
+    counted too, see :func:`ticket_archive.archive_tickets`.
+
+    Parameters
+    ----------
+    overwrite : bool, optional
+        Replace the snapshots already taken, by default only
+        the days without snapshot are written.
+
+    Returns
+    -------
+    days : int
+        Number of days written.
+    """
+    columns = ['id', 'group', 'state', 'created_at', 'close_at']
+    tickets = pd.DataFrame(list(Ticket.objects.exclude(group=None)
+                                .values_list('id', 'group', 'state__name', 'created_at', 'close_at')), columns=columns)
+    changes = pd.DataFrame(list(TicketStateChange.objects.values_list('ticket_id', 'changed_at', 'from_state', 'to_state')),
+                           columns=['ticket_id', 'changed_at', 'from_state', 'to_state'])
+
+    # os tickets arquivados entram com ids negativos, para não colidir com os do Ticket
+    archived = pd.DataFrame(list(ArchivedTicket.objects.exclude(group=None)
+                                 .values_list('id', 'group', 'state__name', 'created_at', 'close_at')), columns=columns)
+    archived['id'] = -archived['id']
+    archived_changes = archived_state_changes()
+    archived_changes['ticket_id'] = -archived_changes.pop('number').map(
+        dict(ArchivedTicket.objects.values_list('number', 'id')))
+    tickets = pd.concat([tickets, archived], ignore_index=True)
+    changes = pd.concat([changes, archived_changes[changes.columns]], ignore_index=True)
+    tickets['state'] = tickets['state'].fillna(UNKNOWN_STATE)
+    for column in ['created_at', 'close_at']:
+        tickets[column] = pd.to_datetime(tickets[column], utc=True)
+    changes['changed_at'] = pd.to_datetime(changes['changed_at'], utc=True)
+
+    yesterday = pd.Timestamp.now(tz='UTC').normalize() - pd.Timedelta(days=1)
+    backlog = daily_backlog_by(backlog_intervals(tickets, changes), ['group', 'state'], yesterday)
+    backlog['date'] = pd.to_datetime(backlog['date']).dt.date
+    if not overwrite:
+        taken = set(BacklogSnapshot.objects.values_list('date', flat=True).distinct())
+        backlog = backlog[~backlog['date'].isin(taken)]
+
+    states = TicketState.ids(backlog.loc[backlog['state'] != UNKNOWN_STATE, 'state'].unique())
+    with transaction.atomic():
+        if overwrite:
+            BacklogSnapshot.objects.filter(date__lte=yesterday.date()).delete()
+        BacklogSnapshot.objects.bulk_create([
+            BacklogSnapshot(date=row.date, group_id=int(row.group), state_id=states.get(row.state), amount=int(row.amount))
+            for row in backlog.itertuples(index=False)
+        ], batch_size=1000)
+
+    days = backlog['date'].nunique()
+    print("[", days, "] Days of backlog snapshots added...")
+    return days
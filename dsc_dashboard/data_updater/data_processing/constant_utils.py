@@ -1,4 +1,6 @@
 AMOUNT_MONTHS_IN_DAYS = 120
+# meses exibidos nos gráficos de tickets por estado
+TRAILING_MONTHS = 5
 MONTH_NUMBER_TO_NAME = {
     1: "Janeiro",
     2: "Fevereiro",
@@ -29,4 +31,38 @@ ZAMMAD_GROUPS_TO_STD_SECTORS = {
     "UAST": "UAST",
     "UACSA": "UACSA",
     "UAEADTec": "UAEADTec"
-}
\ No newline at end of file
+}
+
+# setores com aba no dashboard: nome da aba, grupos do zammad (None para todos) e painéis extras
+SECTOR_REGISTRY = {
+    "diretoria": {
+        "name": "Diretoria STD",
+        "groups": None,
+        "panels": [],
+    },
+    "conectividade": {
+        "name": "Conectividade",
+        "groups": ["Conectividade"],
+        "panels": [],
+    },
+    "sistemas": {
+        "name": "Sistemas",
+        "groups": ["SIG@", "SIGAA", "SIPAC", "SIGRH", "Sistemas Diversos", "Web Sites"],
+        "panels": [],
+    },
+    "servicos_computacionais": {
+        "name": "Serviços Computacionais",
+        "groups": ["Serviços Computacionais"],
+        "panels": [],
+    },
+    "micro_informatica": {
+        "name": "Micro Informática",
+        "groups": ["Micro Informática"],
+        "panels": [],
+    },
+    "suporte": {
+        "name": "Suporte ao Usuário",
+        "groups": ["Triagem"],
+        "panels": ["by_week", "by_hour"],
+    },
+}
@@ -1,10 +1,62 @@
+from django.db.models import F
+
+from dsc_dashboard.db_router import analytics_reads
+from tickets.models import SectorVersion
+
+from .constant_utils import SECTOR_REGISTRY
+from .refresh_context import RefreshContext
+from .data_cleaning import DataCleaning
 from .diretoria import Diretoria
-from .conectividade import Conectividade
 from .sistemas import Sistemas
-from .servicos_computacionais import ServicosComputacionais
-from .micro_informatica import MicroInformatica
 from .suporte import Suporte
 
+SECTORS = list(SECTOR_REGISTRY)
+
+# setores com painéis próprios, os demais usam a DataCleaning
+SECTOR_CLASSES = {
+    "diretoria": Diretoria,
+    "sistemas": Sistemas,
+    "suporte": Suporte,
+}
+
+
+def sectors_of_groups(groups):
+    """
+    Get the dashboard sectors that show the Zammad groups.
+
+    Parameters
+    ----------
+    groups : iterable of str
+        Zammad groups, e.g. ``SIGAA`` or ``Triagem``.
+
+    Returns
+    -------
+    sectors : set of str
+        Names of the sectors, the Diretoria shows every group.
+    """
+    groups = set(groups)
+    return {sector for sector, entry in SECTOR_REGISTRY.items()
+            if entry['groups'] is None or groups.intersection(entry['groups'])}
+
+
+def mark_sectors_dirty(sectors):
+    """
+    Increment the version of the sectors.
+
+    Every process holding an older version recomputes
+    these sectors on its next :meth:`ProcessedData.get_processed_data_dirty`.
+
+    Parameters
+    ----------
+    sectors : iterable of str
+        Names of the sectors, see ``SECTORS``.
+    """
+    sectors = set(sectors)
+    for sector in sectors:
+        SectorVersion.objects.get_or_create(sector=sector)
+    SectorVersion.objects.filter(sector__in=sectors).update(version=F('version') + 1)
+
+
 class Singleton(type):
     _instances = {}
     def __call__(cls, *args, **kwargs):
@@ -14,20 +66,48 @@ class Singleton(type):
         
 class ProcessedData(metaclass=Singleton):
     def __init__(self):
-        self.diretoria = Diretoria()
-        self.conectividade = Conectividade()
-        self.sistemas = Sistemas()
-        self.servicos_computacionais = ServicosComputacionais()
-        self.micro_informatica = MicroInformatica()
-        self.suporte = Suporte()
+        for sector in SECTORS:
+            setattr(self, sector, SECTOR_CLASSES.get(sector, DataCleaning)(sector))
+        self.versions = {}
 
     def get_processed_data_all(self):
-        self.diretoria.get_processed_data()
-        self.conectividade.get_processed_data()
-        self.sistemas.get_processed_data()
-        self.servicos_computacionais.get_processed_data()
-        self.micro_informatica.get_processed_data()
-        self.suporte.get_processed_data()
+        """
+        Recompute every sector.
+
+        The tickets are read once, in a :class:`RefreshContext`
+        shared by the sectors of the ``SECTOR_REGISTRY``.
+        """
+        with analytics_reads():
+            versions = self._get_versions()
+            self.versions = {sector: versions.get(sector, 0) for sector in SECTORS}
+            context = RefreshContext()
+            for sector in SECTORS:
+                getattr(self, sector).get_processed_data(context=context)
+
+    def get_processed_data_dirty(self):
+        """
+        Recompute only the sectors marked as dirty.
+
+        The sectors not computed yet by this process, e.g. on its
+        first call, are dirty too. The versions and the tickets are
+        read from the analytics database, see
+        :func:`dsc_dashboard.db_router.analytics_reads`, so a replica
+        behind the primary only delays the recomputation. The dirty
+        sectors share one :class:`RefreshContext`.
+
+        Returns
+        -------
+        sectors : list of str
+            Names of the recomputed sectors.
+        """
+        with analytics_reads():
+            versions = self._get_versions()
+            sectors = [sector for sector in SECTORS if versions.get(sector, 0) != self.versions.get(sector)]
+            context = RefreshContext()
+            for sector in sectors:
+                getattr(self, sector).get_processed_data(context=context)
+                self.versions[sector] = versions.get(sector, 0)
+        return sectors
 
     def get_data_diretoria(self):
         return self.diretoria
@@ -36,10 +116,11 @@ class ProcessedData(metaclass=Singleton):
         return self.conectividade
     
     def get_data_sistemas(self, group=None):
-        if group:
-            self.sistemas.get_processed_data(group)
-        else:
-            self.sistemas.get_processed_data()
+        # o geral é mantido por get_processed_data_dirty, só é recalculado ao voltar de um grupo,
+        # com o contexto da última atualização do setor, que já tem os totais de cada grupo
+        if group or self.sistemas.view != "sistemas":
+            with analytics_reads():
+                self.sistemas.get_processed_data(group, context=getattr(self.sistemas, "context", None))
         return self.sistemas
 
     def get_data_servicos_computacionais(self):
@@ -50,3 +131,6 @@ class ProcessedData(metaclass=Singleton):
 
     def get_data_suporte(self):
         return self.suporte
+
+    def _get_versions(self):
+        return dict(SectorVersion.objects.values_list('sector', 'version'))
@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+from functools import cached_property
+
+import pandas as pd
+import pytz
+from django.db.models import Sum
+
+from tickets.models import TicketGroup, TicketMonthlyRollup, BacklogSnapshot, SatisfactionResponse
+
+from ..ticket_rollup import NO_GROUP, ROLLUP_COLUMNS
+from ..ticket_store import DIMENSION_COLUMNS
+from .constant_utils import AMOUNT_MONTHS_IN_DAYS
+from . import ticket_queries
+from .state_history import load_state_history
+from .sector_engine import SectorEngine
+
+# colunas dos tickets carregadas nos DataFrames, o title só é carregado quando exibido
+TICKET_FRAME_COLUMNS = ['id', 'id_ticket', 'number', 'created_at', 'close_at', 'updated_at',
+                        'create_article_type', 'state', 'group']
+
+# primeiro mês dos chamados no zammad
+FIRST_MONTH = pd.Period('2021-10', freq='M')
+
+# idade mínima, em dias, dos tickets abertos exibidos na tabela de tickets antigos
+OLD_TICKET_DAYS = 20
+
+# janela, em dias, do leadtime dos tickets fechados
+LEADTIME_DAYS = 210
+
+# janela, em dias, dos tickets do suporte por dia da semana e hora
+WEEKDAY_HOUR_DAYS = 30
+
+
+def load_tickets_frame(tickets, columns=TICKET_FRAME_COLUMNS):
+    """
+    Load the tickets into a DataFrame with typed columns.
+
+    The ids of the ``DIMENSION_COLUMNS`` are replaced by their
+    names, as categories, and the dates are parsed as UTC.
+
+    Parameters
+    ----------
+    tickets : QuerySet
+        The tickets to be loaded.
+    columns : list of str, optional
+        Fields of the tickets, by default ``TICKET_FRAME_COLUMNS``.
+
+    Returns
+    -------
+    tickets : pd.DataFrame
+        Pandas Dataframe with one row per ticket.
+    """
+    df_tickets = pd.DataFrame(list(tickets.values_list(*columns)), columns=columns)
+    for column, model in DIMENSION_COLUMNS.items():
+        if column in df_tickets:
+            df_tickets[column] = df_tickets[column].map(dict(model.objects.values_list('id', 'name'))).astype('category')
+    for column in ['created_at', 'close_at', 'updated_at']:
+        if column in df_tickets:
+            df_tickets[column] = pd.to_datetime(df_tickets[column], utc=True)
+    return df_tickets
+
+
+def in_groups(frame, groups):
+    """
+    Select the rows of the Zammad groups of a sector.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Pandas Dataframe with the Zammad ``group`` of each row.
+    groups : list of str or None
+        Zammad groups, None for every group.
+
+    Returns
+    -------
+    frame : pd.DataFrame
+        The rows of the groups, the frame itself when ``groups`` is None.
+    """
+    if groups is None:
+        return frame
+    return frame[frame['group'].isin(groups)]
+
+
+class RefreshContext:
+    """
+    Data shared by the sectors in one refresh.
+
+    Each table is read once per refresh, the first time a
+    sector needs it, and the sectors only select the rows
+    of their groups, see :func:`in_groups`, or their totals
+    computed for every sector at once by the :attr:`sectors`,
+    instead of each one querying the database again. The
+    counts of the tickets are aggregated by the database, see
+    :mod:`ticket_queries`; the :attr:`tickets` of the window
+    are only loaded by the pandas path of the parity tests.
+    """
+
+    def __init__(self):
+        self.now = datetime.now()
+        self._backlog_snapshots = {}
+        self._state_histories = {}
+
+    @cached_property
+    def sectors(self):
+        """
+        Totals of every sector, see :class:`SectorEngine`.
+        """
+        return SectorEngine(self)
+
+    @cached_property
+    def groups(self):
+        """
+        Names of the Zammad groups.
+        """
+        return list(TicketGroup.objects.exclude(name=NO_GROUP).order_by('name').values_list('name', flat=True))
+
+    @cached_property
+    def months(self):
+        """
+        Months since ``FIRST_MONTH`` until the current one.
+        """
+        return pd.period_range(FIRST_MONTH, pd.Timestamp(self.now).to_period('M'), freq='M')
+
+    @cached_property
+    def tickets(self):
+        """
+        Tickets created or closed in the last ``AMOUNT_MONTHS_IN_DAYS``.
+        """
+        return load_tickets_frame(ticket_queries.window_tickets(self._since(AMOUNT_MONTHS_IN_DAYS)))
+
+    @cached_property
+    def old_open_tickets(self):
+        """
+        Tickets still open created more than ``OLD_TICKET_DAYS`` ago, with their titles and age in days, ``idade``.
+        """
+        tickets = load_tickets_frame(ticket_queries.old_open_tickets(self._since(OLD_TICKET_DAYS)),
+                                     TICKET_FRAME_COLUMNS + ['title'])
+        tickets['idade'] = (pd.Timestamp(self.now, tz='UTC') - tickets['created_at']).dt.days
+        return tickets
+
+    @cached_property
+    def leadtime(self):
+        """
+        Leadtime of the tickets closed in the last ``LEADTIME_DAYS``.
+        """
+        return load_tickets_frame(ticket_queries.leadtime_tickets(self._since(LEADTIME_DAYS)),
+                                  ['number', 'group', 'created_at', 'close_at', 'leadtime_hours'])
+
+    @cached_property
+    def rollup(self):
+        """
+        Monthly totals of every group since ``FIRST_MONTH``, the tickets without group with a null ``group``.
+        """
+        rollup = TicketMonthlyRollup.objects.filter(month__gte=FIRST_MONTH.to_timestamp().date())
+        rollup = pd.DataFrame(list(rollup.values_list('group__name', 'month', *ROLLUP_COLUMNS)),
+                              columns=['group', 'month'] + ROLLUP_COLUMNS)
+        rollup['group'] = rollup['group'].where(rollup['group'] != NO_GROUP).astype('category')
+        rollup['month'] = pd.to_datetime(rollup['month']).dt.to_period('M')
+        rollup[ROLLUP_COLUMNS] = rollup[ROLLUP_COLUMNS].astype('int64')
+        return rollup
+
+    @cached_property
+    def closed_totals(self):
+        """
+        Number of closed tickets of each group, including the archived ones.
+        """
+        return ticket_queries.closed_totals()
+
+    @cached_property
+    def open_totals(self):
+        """
+        Number of tickets of each group in the backlog now.
+        """
+        return ticket_queries.open_totals()
+
+    @cached_property
+    def satisfaction_by_group(self):
+        """
+        Satisfaction answers of the tickets of each group in the last ``AMOUNT_MONTHS_IN_DAYS``, by score.
+        """
+        return ticket_queries.satisfaction_by_group(self._since(AMOUNT_MONTHS_IN_DAYS))
+
+    @cached_property
+    def satisfaction_counts(self):
+        """
+        Last answers of the satisfaction survey of every ticket, by score.
+        """
+        return ticket_queries.satisfaction_counts()
+
+    @cached_property
+    def tickets_by_weekday_and_hour(self):
+        """
+        Tickets of each group created in the last ``WEEKDAY_HOUR_DAYS``, by article type, weekday and hour (UTC).
+        """
+        return ticket_queries.tickets_by_weekday_and_hour(self._since(WEEKDAY_HOUR_DAYS))
+
+    @cached_property
+    def satisfaction_scores(self):
+        """
+        Last answer of the satisfaction survey of each ticket, indexed by the ticket number.
+        """
+        answers = pd.DataFrame(list(SatisfactionResponse.objects.order_by('row').values_list('number', 'score')),
+                               columns=['number', 'score'])
+        return answers.drop_duplicates(subset='number', keep='last').set_index('number')['score']
+
+    def backlog_snapshots(self, days):
+        """
+        Get the backlog snapshots of some days.
+
+        Parameters
+        ----------
+        days : list of datetime.date
+            Days of the snapshots.
+
+        Returns
+        -------
+        snapshots : pd.DataFrame
+            Pandas Dataframe with the ``date``, ``group`` and
+            ``amount`` of each group on each day taken.
+        """
+        key = tuple(days)
+        if key not in self._backlog_snapshots:
+            snapshots = pd.DataFrame(list(BacklogSnapshot.objects.filter(date__in=days)
+                                          .values_list('date', 'group__name').annotate(amount=Sum('amount'))),
+                                     columns=['date', 'group', 'amount'])
+            self._backlog_snapshots[key] = snapshots
+        return self._backlog_snapshots[key]
+
+    def state_history(self, days):
+        """
+        Get the state history of the tickets that may be in the backlog on some days.
+
+        Only the tickets created until the last day and not closed
+        before the first one are loaded, see :func:`load_state_history`.
+
+        Parameters
+        ----------
+        days : list of datetime.date
+            Days of the backlog, in UTC.
+
+        Returns
+        -------
+        tickets : pd.DataFrame
+            Tickets of every group, with their ``group``.
+        changes : pd.DataFrame
+            State transitions of the tickets.
+        """
+        key = tuple(days)
+        if key not in self._state_histories:
+            since = datetime.combine(min(days), datetime.min.time(), tzinfo=pytz.UTC)
+            until = datetime.combine(max(days) + timedelta(days=1), datetime.min.time(), tzinfo=pytz.UTC)
+            self._state_histories[key] = load_state_history(since=since, until=until)
+        return self._state_histories[key]
+
+    def _since(self, days):
+        # início de uma janela de dias, com o fuso UTC dos tickets
+        return (self.now - timedelta(days=days)).replace(tzinfo=pytz.UTC)
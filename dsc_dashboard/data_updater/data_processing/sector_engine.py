@@ -0,0 +1,297 @@
+from functools import cached_property
+
+import pandas as pd
+
+from ..ticket_rollup import ROLLUP_COLUMNS
+from .constant_utils import SECTOR_REGISTRY
+from .state_history import state_intervals, daily_backlog_by
+
+# notas da pesquisa de satisfação
+SATISFACTION_SCORES = list(range(11))
+
+
+class SectorEngine:
+    """
+    Aggregates of every sector of the registry at once.
+
+    Each table of the :class:`RefreshContext` is grouped once by
+    Zammad group, then the totals of the groups are summed into
+    every view: the sectors of the ``SECTOR_REGISTRY`` and each
+    Zammad group on its own, e.g. ``SIGAA`` in the Sistemas tab.
+    A new sector in the registry only adds rows to
+    :attr:`membership`, not queries or passes over the tickets.
+
+    Parameters
+    ----------
+    context : RefreshContext
+        Data of the refresh.
+    registry : dict, optional
+        Sectors of the dashboard, by default ``SECTOR_REGISTRY``.
+    """
+
+    def __init__(self, context, registry=SECTOR_REGISTRY):
+        self.context = context
+        self.registry = registry
+        self._backlog = {}
+
+    @cached_property
+    def groups(self):
+        """
+        Names of the Zammad groups, including the ones of the registry without tickets yet.
+        """
+        groups = list(self.context.groups)
+        for entry in self.registry.values():
+            groups += [group for group in entry['groups'] or [] if group not in groups]
+        return groups
+
+    @cached_property
+    def views(self):
+        """
+        Names of the views, the sectors followed by the Zammad groups.
+        """
+        return list(self.registry) + self.groups
+
+    @cached_property
+    def membership(self):
+        """
+        Pandas Dataframe with the ``view`` and ``group`` of each Zammad group of each view.
+
+        The sectors without groups, e.g. the Diretoria, have
+        every group, including the tickets without group.
+        """
+        pairs = [(group, group) for group in self.groups]
+        for sector, entry in self.registry.items():
+            groups = self.groups + [None] if entry['groups'] is None else entry['groups']
+            pairs += [(sector, group) for group in groups]
+        return pd.DataFrame(pairs, columns=['view', 'group'])
+
+    def monthly(self, view):
+        """
+        Get the monthly totals of a view.
+
+        Parameters
+        ----------
+        view : str
+            Sector of the registry or Zammad group.
+
+        Returns
+        -------
+        monthly : pd.DataFrame
+            Pandas Dataframe with the ``ROLLUP_COLUMNS`` of every
+            month since ``FIRST_MONTH``, indexed by the month.
+        """
+        return self._monthly.loc[view]
+
+    def states(self, view, trailing_months):
+        """
+        Get the opened and closed tickets of the last months of a view.
+
+        The series of every view are computed at once, see
+        :attr:`_series`, so each call only slices them.
+
+        Parameters
+        ----------
+        view : str
+            Sector of the registry or Zammad group.
+        trailing_months : int
+            Number of months, the last one is the current month.
+
+        Returns
+        -------
+        states : pd.DataFrame
+            Pandas Dataframe with the ``opened`` and ``closed``
+            tickets of each month and the ``total_opened`` and
+            ``total_closed`` since ``FIRST_MONTH``, 0 in the months
+            without tickets, indexed by the month.
+        """
+        row = self._rows[view]
+        window = slice(-trailing_months, None)
+        return pd.DataFrame({name: series[row, window] for name, series in self._series.items()},
+                            index=self.context.months[window])
+
+    def leadtime(self, views, since):
+        """
+        Get the mean leadtime of some views in each month.
+
+        Parameters
+        ----------
+        views : list of str
+            Sectors of the registry or Zammad groups.
+        since : pd.Period
+            First month.
+
+        Returns
+        -------
+        leadtime : pd.DataFrame
+            Pandas Dataframe with the mean leadtime, in whole days,
+            of each view, 0 when it closed no ticket, indexed by
+            the months in which some view closed tickets.
+        """
+        index = self._monthly.index
+        monthly = self._monthly.loc[index.get_level_values('view').isin(views) & (index.get_level_values('month') >= since),
+                                    ['leadtime_sum', 'leadtime_count']]
+        monthly = monthly.unstack('view', fill_value=0)
+        closed = monthly['leadtime_count'].gt(0)
+        leadtime = (monthly['leadtime_sum'] / monthly['leadtime_count']).where(closed, 0).astype(int)
+        return leadtime.loc[closed.any(axis=1)].reindex(columns=views, fill_value=0)
+
+    def closed_total(self, view):
+        """
+        Number of tickets of a view in the ``closed`` state, including the archived ones.
+        """
+        return int(self._totals['closed'].get(view, 0))
+
+    def open_total(self, view):
+        """
+        Number of tickets of a view in the backlog now.
+        """
+        return int(self._totals['open'].get(view, 0))
+
+    def satisfaction(self, view):
+        """
+        Get the satisfaction answers of the tickets of a view.
+
+        Only the last answer of the tickets created or closed in
+        the last ``AMOUNT_MONTHS_IN_DAYS`` is counted, without the
+        merged ones, see :attr:`RefreshContext.satisfaction_by_group`.
+
+        Parameters
+        ----------
+        view : str
+            Sector of the registry or Zammad group.
+
+        Returns
+        -------
+        counts : pd.Series
+            Number of answers of each score, indexed by the score.
+        """
+        return self._satisfaction.loc[view]
+
+    def backlog(self, view, months):
+        """
+        Get the backlog of a view at the end of each month.
+
+        The past months come from the backlog snapshots of their
+        last day, see :func:`backlog.snapshot_backlog`, read once
+        for every view. The months whose snapshot is missing come
+        from the state history of the tickets that may be open at
+        their end, see :meth:`RefreshContext.state_history`, also
+        loaded once for every view.
+
+        Parameters
+        ----------
+        view : str
+            Sector of the registry or Zammad group.
+        months : list of pd.Period
+            Months of the series, the last one is the current
+            month, whose backlog is the :meth:`open_total`.
+
+        Returns
+        -------
+        backlog : list of int or None
+            Backlog of each month, None when the snapshot of
+            the end of a month is missing and no ticket of the
+            view has state transitions.
+        """
+        days = [month.to_timestamp(how='end').date() for month in months[:-1]]
+        key = tuple(days)
+        if key not in self._backlog:
+            self._backlog[key] = self._month_end_backlog(days)
+
+        backlog, history_views = self._backlog[key]
+        if history_views is not None and view not in history_views:
+            return None
+        return [int(amount) for amount in backlog.loc[view]] + [self.open_total(view)]
+
+    def _month_end_backlog(self, days):
+        """
+        Get the backlog of every view on some days.
+
+        Parameters
+        ----------
+        days : list of datetime.date
+            Last days of the past months.
+
+        Returns
+        -------
+        backlog : pd.Series
+            Number of tickets in the backlog, indexed by
+            the ``view`` and the ``date``.
+        history_views : set of str or None
+            Views with state transitions, which have the days
+            without snapshot, None when no snapshot is missing.
+        """
+        index = pd.MultiIndex.from_product([self.views, days], names=['view', 'date'])
+        snapshots = self.context.backlog_snapshots(days)
+        missing = sorted(set(days) - set(snapshots['date']))
+        if not missing:
+            return self._sum_by_view(snapshots, ['date'], ['amount'])['amount'].reindex(index, fill_value=0), None
+
+        tickets, changes = self.context.state_history(missing)
+        changed = tickets[tickets['id'].isin(changes['ticket_id'])].assign(amount=1)
+        history_views = set(self._sum_by_view(changed, [], ['amount']).index)
+
+        # os tickets sem grupo entram como '', pois o daily_backlog_by descarta as chaves nulas
+        intervals = state_intervals(tickets, changes)
+        intervals['group'] = intervals['ticket_id'].map(tickets.set_index('id')['group']).fillna('')
+        history = daily_backlog_by(intervals, ['group'], pd.Timestamp(missing[-1], tz='UTC'))
+        history['group'] = history['group'].where(history['group'] != '', None)
+        history['date'] = pd.to_datetime(history['date']).dt.date
+        history = history[history['date'].isin(missing)]
+
+        return self._sum_by_view(pd.concat([snapshots, history], ignore_index=True), ['date'], ['amount'])[
+            'amount'].reindex(index, fill_value=0), history_views
+
+    @cached_property
+    def _monthly(self):
+        index = pd.MultiIndex.from_product([self.views, self.context.months], names=['view', 'month'])
+        return self._sum_by_view(self.context.rollup, ['month'], ROLLUP_COLUMNS).reindex(index, fill_value=0)
+
+    @cached_property
+    def _rows(self):
+        return {view: row for row, view in enumerate(self.views)}
+
+    @cached_property
+    def _series(self):
+        # uma linha por view e uma coluna por mês, na ordem do índice do _monthly
+        shape = (len(self.views), len(self.context.months))
+        opened = self._monthly['opened'].to_numpy().reshape(shape)
+        closed = self._monthly['closed'].to_numpy().reshape(shape)
+        return {'opened': opened, 'closed': closed,
+                'total_opened': opened.cumsum(axis=1), 'total_closed': closed.cumsum(axis=1)}
+
+    @cached_property
+    def _totals(self):
+        totals = pd.DataFrame({'open': self.context.open_totals, 'closed': self.context.closed_totals}).fillna(0)
+        totals = totals.rename_axis('group').reset_index()
+        return self._sum_by_view(totals, [], ['open', 'closed']).reindex(self.views, fill_value=0)
+
+    @cached_property
+    def _satisfaction(self):
+        index = pd.MultiIndex.from_product([self.views, SATISFACTION_SCORES], names=['view', 'score'])
+        answers = self.context.satisfaction_by_group
+        return self._sum_by_view(answers, ['score'], ['amount'])['amount'].reindex(index, fill_value=0)
+
+    def _sum_by_view(self, frame, by, columns):
+        """
+        Sum the columns of every view at once.
+
+        Parameters
+        ----------
+        frame : pd.DataFrame
+            Pandas Dataframe with the Zammad ``group`` of each row.
+        by : list of str
+            Other columns of the groups, e.g. the ``month``.
+        columns : list of str
+            Columns summed.
+
+        Returns
+        -------
+        totals : pd.DataFrame
+            Pandas Dataframe with the sum of the ``columns``,
+            indexed by the ``view`` and the ``by`` columns.
+        """
+        frame = frame.assign(group=frame['group'].astype(object))
+        totals = frame.groupby(['group'] + by, dropna=False)[columns].sum().reset_index()
+        totals = totals.merge(self.membership, on='group')
+        return totals.groupby(['view'] + by)[columns].sum()
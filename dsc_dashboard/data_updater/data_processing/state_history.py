@@ -0,0 +1,138 @@
+import pandas as pd
+from django.db.models import Exists, OuterRef, Q
+
+from tickets.models import Ticket, TicketStateChange
+
+# estados em que o ticket deixa de fazer parte do backlog
+CLOSED_STATES = ['closed', 'merged']
+
+
+def load_state_history(groups=None, since=None, until=None):
+    """
+    Get the tickets and their state transitions.
+
+    Parameters
+    ----------
+    groups : list of str, optional
+        Zammad groups of the tickets, by default every ticket.
+    since : datetime.datetime, optional
+        Only the tickets that may be in the backlog after this
+        date: not closed, closed after it or with a transition
+        after it. By default every ticket.
+    until : datetime.datetime, optional
+        Only the tickets created before this date.
+
+    Returns
+    -------
+    tickets : pd.DataFrame
+        Pandas Dataframe with the ``id``, ``created_at``, ``state``
+        and ``group`` of the tickets, empty when there is no transition.
+    changes : pd.DataFrame
+        Pandas Dataframe with the ``ticket_id``, ``changed_at``,
+        ``from_state`` and ``to_state`` of the transitions.
+    """
+    tickets = Ticket.objects.all()
+    if groups is not None:
+        tickets = tickets.filter(group__name__in=groups)
+    if until is not None:
+        tickets = tickets.filter(created_at__lt=until)
+    if since is not None:
+        later_changes = TicketStateChange.objects.filter(ticket=OuterRef('pk'), changed_at__gte=since)
+        tickets = tickets.filter(Q(close_at=None) | Q(close_at__gte=since) | ~Q(state__name__in=CLOSED_STATES)
+                                 | Exists(later_changes))
+    changes = TicketStateChange.objects.all()
+    if groups is not None or until is not None or since is not None:
+        changes = changes.filter(ticket__in=tickets.values('pk'))
+
+    changes = pd.DataFrame(list(changes.values_list('ticket_id', 'changed_at', 'from_state', 'to_state')),
+                           columns=['ticket_id', 'changed_at', 'from_state', 'to_state'])
+    tickets = pd.DataFrame(list(tickets.values_list('id', 'created_at', 'state__name', 'group__name')) if not changes.empty else [],
+                           columns=['id', 'created_at', 'state', 'group'])
+    tickets['created_at'] = pd.to_datetime(tickets['created_at'], utc=True)
+    changes['changed_at'] = pd.to_datetime(changes['changed_at'], utc=True)
+    return tickets, changes
+
+
+def state_intervals(tickets, changes):
+    """
+    Build the periods each ticket spent in each state.
+
+    The first period starts at the ticket creation, in the
+    ``from_state`` of its first transition, or in its current
+    state when it never changed. Each transition starts a new
+    period, and the last one has no end.
+
+    Parameters
+    ----------
+    tickets : pd.DataFrame
+        Tickets returned by :func:`load_state_history`.
+    changes : pd.DataFrame
+        Transitions returned by :func:`load_state_history`.
+
+    Returns
+    -------
+    intervals : pd.DataFrame
+        Pandas Dataframe with the ``ticket_id``, ``state``,
+        ``start`` and ``end`` of each period, ``end`` is NaT
+        for the current state.
+    """
+    changes = changes[changes['ticket_id'].isin(tickets['id'])].sort_values(['ticket_id', 'changed_at'])
+
+    first = changes.drop_duplicates('ticket_id').set_index('ticket_id')['from_state']
+    initial = pd.DataFrame({
+        'ticket_id': tickets['id'],
+        'state': tickets['id'].map(first).fillna(tickets['state']),
+        'start': tickets['created_at'],
+    })
+    following = pd.DataFrame({
+        'ticket_id': changes['ticket_id'],
+        'state': changes['to_state'],
+        'start': changes['changed_at'],
+    })
+
+    intervals = pd.concat([initial, following], ignore_index=True)
+    intervals = intervals.sort_values(['ticket_id', 'start'], kind='mergesort').reset_index(drop=True)
+    intervals['end'] = intervals.groupby('ticket_id')['start'].shift(-1)
+    return intervals
+
+
+def daily_backlog_by(intervals, keys, end=None):
+    """
+    Count the tickets in the backlog at the end of each day, by ``keys``.
+
+    A ticket is in the backlog while it is not in one of the
+    ``CLOSED_STATES``. Each open period adds one ticket on the
+    day it starts and removes it on the day it ends, if it has
+    ended. The deltas of each day and key form a matrix, and its
+    cumulative sum along the days is the backlog of every key.
+
+    Parameters
+    ----------
+    intervals : pd.DataFrame
+        Periods returned by :func:`state_intervals`, with the ``keys``.
+    keys : list of str
+        Columns of the intervals the backlog is split by.
+    end : pd.Timestamp, optional
+        Last day of the series, by default today.
+
+    Returns
+    -------
+    backlog : pd.DataFrame
+        Pandas Dataframe with the ``date``, the ``keys`` and the
+        ``amount`` of tickets, without the zero amounts.
+    """
+    open_intervals = intervals[~intervals['state'].isin(CLOSED_STATES)]
+    end = (end if end is not None else pd.Timestamp.now(tz='UTC')).normalize()
+    if open_intervals.empty:
+        return pd.DataFrame(columns=['date'] + keys + ['amount'])
+
+    deltas = pd.concat([
+        open_intervals[keys].assign(date=open_intervals['start'].dt.normalize(), delta=1),
+        open_intervals[keys].assign(date=open_intervals['end'].dt.normalize(), delta=-1).dropna(subset=['date']),
+    ])
+    matrix = deltas.groupby(['date'] + keys)['delta'].sum().unstack(keys, fill_value=0)
+    days = pd.date_range(min(matrix.index.min(), end), end, freq='D')
+    matrix = matrix.reindex(days.union(matrix.index), fill_value=0).cumsum().reindex(days)
+
+    backlog = matrix.rename_axis('date').stack(keys).rename('amount').reset_index()
+    return backlog[backlog['amount'] != 0].reset_index(drop=True)
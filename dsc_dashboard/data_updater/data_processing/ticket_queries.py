@@ -0,0 +1,256 @@
+import pandas as pd
+import pytz
+from django.db.models import CharField, Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, ExtractHour, ExtractIsoWeekDay
+
+from tickets.models import Ticket, ArchivedTicket, SatisfactionResponse
+
+from .state_history import CLOSED_STATES
+
+# colunas das contagens de tickets por dia da semana e hora
+WEEKDAY_HOUR_COLUMNS = ['group', 'create_article_type', 'weekday', 'hour', 'amount']
+
+# colunas das contagens de respostas da pesquisa de satisfação
+SATISFACTION_COLUMNS = ['group', 'score', 'amount']
+
+
+def window_tickets(since):
+    """
+    Get the tickets created or closed since a date.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        First date, with timezone.
+
+    Returns
+    -------
+    tickets : QuerySet
+        The tickets of the window.
+    """
+    return Ticket.objects.filter(Q(created_at__gte=since) | Q(close_at__gte=since))
+
+
+def old_open_tickets(before):
+    """
+    Get the tickets still open created before a date.
+
+    Parameters
+    ----------
+    before : datetime.datetime
+        Creation date limit, with timezone.
+
+    Returns
+    -------
+    tickets : QuerySet
+        The tickets not in one of the ``CLOSED_STATES``.
+    """
+    return (Ticket.objects.exclude(state__name__in=CLOSED_STATES).exclude(state=None)
+            .filter(created_at__lt=before))
+
+
+def leadtime_tickets(since):
+    """
+    Get the tickets closed after a date with their leadtime.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        Close date limit, with timezone.
+
+    Returns
+    -------
+    tickets : QuerySet
+        The tickets closed after ``since`` with ``leadtime_hours``.
+    """
+    return Ticket.objects.filter(close_at__gt=since, leadtime_hours__isnull=False)
+
+
+def closed_counts(model=Ticket):
+    """
+    Count the closed tickets of each group in a table.
+
+    Parameters
+    ----------
+    model : type, optional
+        :class:`Ticket` or :class:`ArchivedTicket`.
+
+    Returns
+    -------
+    counts : QuerySet
+        Pairs of group name and number of tickets in the ``closed`` state.
+    """
+    return model.objects.filter(state__name="closed").values_list('group__name').annotate(amount=Count('id'))
+
+
+def closed_totals():
+    """
+    Count the closed tickets of each group, including the archived ones.
+
+    See :func:`closed_counts`.
+
+    Returns
+    -------
+    totals : pd.Series
+        Number of tickets in the ``closed`` state, indexed by the group.
+    """
+    totals = pd.Series(dtype='int64')
+    for model in [Ticket, ArchivedTicket]:
+        counts = pd.Series(dict(closed_counts(model)), dtype='int64')
+        totals = totals.add(counts, fill_value=0).astype('int64')
+    return totals
+
+
+def open_totals():
+    """
+    Count the tickets of each group in the backlog.
+
+    Returns
+    -------
+    totals : pd.Series
+        Number of tickets not in one of the ``CLOSED_STATES``,
+        indexed by the group.
+    """
+    return pd.Series(dict(Ticket.objects.exclude(state__name__in=CLOSED_STATES).values_list('group__name')
+                          .annotate(amount=Count('id'))), dtype='int64')
+
+
+def satisfaction_counts():
+    """
+    Count the last satisfaction answer of every ticket by score.
+
+    Returns
+    -------
+    counts : pd.Series
+        Number of answers of each score, indexed by the score.
+    """
+    last_rows = SatisfactionResponse.objects.values('number').annotate(last_row=Max('row')).values('last_row')
+    counts = (SatisfactionResponse.objects.filter(row__in=Subquery(last_rows), score__isnull=False)
+              .values_list('score').annotate(amount=Count('id')))
+    return pd.Series(dict(counts), dtype='int64')
+
+
+def satisfaction_by_group(since):
+    """
+    Count the satisfaction answers of the tickets of each group.
+
+    Only the last answer of each ticket created or closed since
+    ``since`` is counted, without the merged tickets. The database
+    returns the counts, see :func:`satisfaction_by_group_frame`
+    for the same counts from the ticket rows.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        First date of the window, with timezone.
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        Pandas Dataframe with the ``SATISFACTION_COLUMNS``.
+    """
+    last_score = (SatisfactionResponse.objects.filter(number=Cast(OuterRef('number'), CharField()))
+                  .order_by('-row').values('score')[:1])
+    counts = (window_tickets(since).exclude(state__name='merged')
+              .annotate(score=Subquery(last_score)).filter(score__isnull=False)
+              .values_list('group__name', 'score').annotate(amount=Count('id')))
+    return pd.DataFrame(list(counts), columns=SATISFACTION_COLUMNS).astype({'score': 'int64', 'amount': 'int64'})
+
+
+def satisfaction_by_group_frame(tickets, scores):
+    """
+    Count the satisfaction answers of the tickets of each group in pandas.
+
+    Parameters
+    ----------
+    tickets : pd.DataFrame
+        Tickets of the window, see ``RefreshContext.tickets``.
+    scores : pd.Series
+        Last score of each ticket, see ``RefreshContext.satisfaction_scores``.
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        Pandas Dataframe with the ``SATISFACTION_COLUMNS``.
+    """
+    tickets = tickets[tickets['state'] != 'merged']
+    answers = pd.DataFrame({'group': tickets['group'].astype(object),
+                            'score': tickets['number'].astype(str).map(scores)}).dropna(subset=['score'])
+    counts = answers.groupby(['group', 'score'], dropna=False).size().rename('amount').reset_index()
+    # os tickets sem grupo ficam com None, como no banco
+    counts['group'] = counts['group'].where(counts['group'].notna(), None)
+    return counts[SATISFACTION_COLUMNS].astype({'score': 'int64', 'amount': 'int64'})
+
+
+def weekday_and_hour_counts(since):
+    """
+    Count the tickets created since a date by weekday and hour in the database.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        First creation date, with timezone.
+
+    Returns
+    -------
+    counts : QuerySet
+        Tuples with the ``WEEKDAY_HOUR_COLUMNS``.
+    """
+    return (Ticket.objects.filter(created_at__gte=since).exclude(state__name='merged')
+            .annotate(weekday=ExtractIsoWeekDay('created_at', tzinfo=pytz.UTC),
+                      hour=ExtractHour('created_at', tzinfo=pytz.UTC))
+            .values_list('group__name', 'create_article_type__name', 'weekday', 'hour')
+            .annotate(amount=Count('id')))
+
+
+def tickets_by_weekday_and_hour(since):
+    """
+    Count the tickets created since a date by weekday and hour.
+
+    The weekday, from 1 (Monday) to 7 (Sunday), and the hour
+    are taken in UTC by the database, see :func:`weekday_and_hour_counts`.
+    The merged tickets are not counted. See
+    :func:`tickets_by_weekday_and_hour_frame` for the same counts
+    from the ticket rows.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        First creation date, with timezone.
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        Pandas Dataframe with the ``WEEKDAY_HOUR_COLUMNS``, by
+        Zammad group and article type.
+    """
+    counts = weekday_and_hour_counts(since)
+    return pd.DataFrame(list(counts), columns=WEEKDAY_HOUR_COLUMNS).astype({'weekday': 'int64', 'hour': 'int64', 'amount': 'int64'})
+
+
+def tickets_by_weekday_and_hour_frame(tickets, since):
+    """
+    Count the tickets created since a date by weekday and hour in pandas.
+
+    Parameters
+    ----------
+    tickets : pd.DataFrame
+        Tickets of the window, see ``RefreshContext.tickets``.
+    since : datetime.datetime
+        First creation date, with timezone.
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        Pandas Dataframe with the ``WEEKDAY_HOUR_COLUMNS``.
+    """
+    tickets = tickets[(tickets['created_at'] >= since) & (tickets['state'] != 'merged')]
+    counts = pd.DataFrame({'group': tickets['group'].astype(object),
+                           'create_article_type': tickets['create_article_type'].astype(object),
+                           'weekday': tickets['created_at'].dt.dayofweek + 1,
+                           'hour': tickets['created_at'].dt.hour})
+    counts = counts.groupby(WEEKDAY_HOUR_COLUMNS[:-1], dropna=False).size().rename('amount').reset_index()
+    # os tickets sem grupo ou tipo ficam com None, como no banco
+    for column in ['group', 'create_article_type']:
+        counts[column] = counts[column].where(counts[column].notna(), None)
+    return counts[WEEKDAY_HOUR_COLUMNS].astype({'weekday': 'int64', 'hour': 'int64', 'amount': 'int64'})
@@ -1,178 +1,452 @@
-import pandas as pd
-import shlex
-import subprocess
-import json
-import os
+from collections import Counter
+
+import requests
 from dateutil.tz import gettz
 from datetime import datetime
-from tickets.models import Ticket
-from .data_processing.processed_data import ProcessedData
+from tickets.models import Ticket, ArchivedTicket, SyncWatermark, TicketMonthlyRollup
+from .data_processing.processed_data import SECTORS, mark_sectors_dirty, sectors_of_groups
+from .zammad_client import ZammadClient
+from .ticket_store import upsert_tickets
+from .archive import archive_payload, read_archive
+from .ticket_history import replay_state_history
 from dateutil.parser import parse
 import pytz
 
-processed_data = ProcessedData()
+TICKET_COLUMNS = ['created_at', 'close_at', 'updated_at', 'create_article_type', 'state', 'id', 'number', 'group', 'title']
 
-def all_tickets():
+# campos que o zammad só expande com ``expand=true``, e o id correspondente
+EXPANDED_FIELDS = {
+    'group': 'group_id',
+    'state': 'state_id',
+    'create_article_type': 'create_article_type_id',
+}
+
+# nome dos objetos dos campos expandidos dentro de ``assets``
+EXPANDED_FIELDS_ASSETS = {
+    'group': 'Group',
+    'state': 'TicketState',
+}
+
+# tipo do payload arquivado de cada lista de objetos
+LOOKUP_KINDS = {
+    'group': 'groups',
+    'state': 'ticket_states',
+}
+
+WATERMARK_NAME = 'tickets'
+
+# tamanho das páginas de ``/api/v1/tickets``
+PER_PAGE = 100
+
+
+def load_lookups(client):
     """
-    Get all tickets from Zammad.
+    Get the names of groups and ticket states.
 
-    Get all tickets from Zammad using its API, put into
-    a Pandas DataFrame, then create objects from Ticket
-    to put all data on MySQL. This function also converts
-    the date string from Zammad into datetime, which is needed
-    for the MySQL.
+    Build the dictionaries that map the ids of the
+    non-expanded Zammad tickets to their names. When
+    the user can not list some object, its dictionary
+    starts empty and it is filled by :func:`tickets_from_search`.
+
+    Parameters
+    ----------
+    client : ZammadClient
+        Client used to access the Zammad API.
+
+    Returns
+    -------
+    lookups : dict of {str : dict of {int : str}}
+        Dictionary with a id to name mapping for each expanded field.
     """
-    df = pd.DataFrame()
-    page = 1
+    lookups = {field: {} for field in EXPANDED_FIELDS}
+    for field, path in (('group', '/api/v1/groups'), ('state', '/api/v1/ticket_states')):
+        try:
+            payload = client.get(path)
+            archive_payload(LOOKUP_KINDS[field], payload)
+            lookups[field] = {obj['id']: obj['name'] for obj in payload}
+        except requests.HTTPError:
+            print("Error fetching " + path + ", resolving " + field + " by ticket!")
+
+    return lookups
+
+
+def tickets_from_search(client, payload, lookups):
+    """
+    Build the ticket records from a search page.
+
+    The search response already brings the tickets under
+    ``assets['Ticket']``, but with ids in place of the expanded
+    fields. Those ids are resolved with ``lookups``. For each id
+    that is still unknown, a single ticket that has it is fetched
+    with ``expand=true``, and the learned name is kept in ``lookups``
+    for the next tickets and pages.
+
+    Parameters
+    ----------
+    client : ZammadClient or None
+        Client used to access the Zammad API, without it the
+        unknown ids are left unresolved, see :func:`replay`.
+    payload : dict
+        Decoded response of ``/api/v1/tickets/search``.
+    lookups : dict of {str : dict of {int : str}}
+        Dictionary returned by :func:`load_lookups`.
+
+    Returns
+    -------
+    records : list of dict
+        The tickets with the ``TICKET_COLUMNS`` fields.
+    """
+    assets = payload['assets']
+    for field, asset_name in EXPANDED_FIELDS_ASSETS.items():
+        for obj in assets.get(asset_name, {}).values():
+            lookups[field][obj['id']] = obj['name']
+
+    ids = payload.get('tickets') or assets['Ticket'].keys()
+    tickets = [assets['Ticket'][str(id)] for id in ids]
+
+    # um ticket de exemplo para cada id desconhecido
+    probes = {}
+    for ticket in tickets:
+        for field, id_field in EXPANDED_FIELDS.items():
+            if ticket.get(field) is None and ticket.get(id_field) is not None \
+                    and ticket[id_field] not in lookups[field]:
+                probes.setdefault((field, ticket[id_field]), ticket['id'])
+
+    if probes and client is not None:
+        details = client.get_many(["/api/v1/tickets/" + str(id) for id in set(probes.values())], {"expand": "true"})
+        for detail in details:
+            archive_payload('ticket', detail)
+            for field, id_field in EXPANDED_FIELDS.items():
+                if detail.get(id_field) is not None:
+                    lookups[field][detail[id_field]] = detail.get(field)
+
+    records = []
+    for ticket in tickets:
+        record = {column: ticket.get(column) for column in TICKET_COLUMNS}
+        for field, id_field in EXPANDED_FIELDS.items():
+            if record[field] is None and ticket.get(id_field) is not None:
+                record[field] = lookups[field].get(ticket[id_field])
+        records.append(record)
+
+    return records
+
+
+def ticket_record(ticket):
+    """
+    Build a ticket record from a Zammad ticket.
+
+    Parameters
+    ----------
+    ticket : dict
+        Zammad ticket, with the expanded fields as names
+        or as objects that have a ``name``.
+
+    Returns
+    -------
+    record : dict
+        The ticket with the ``TICKET_COLUMNS`` fields.
+    """
+    record = {column: ticket.get(column) for column in TICKET_COLUMNS}
+    for field in EXPANDED_FIELDS:
+        if isinstance(record[field], dict):
+            record[field] = record[field].get('name')
+    return record
+
+
+def save_tickets(records, mark_dirty=False):
+    """
+    Store tickets on MySQL.
+
+    Create or update the tickets in batches, see
+    :func:`ticket_store.upsert_tickets`, using ``number``
+    to find the existing ones. The unchanged tickets
+    are skipped.
+
+    Parameters
+    ----------
+    records : list of dict
+        The tickets with the ``TICKET_COLUMNS`` fields.
+    mark_dirty : bool, optional
+        Mark the sectors of the tickets as dirty, including the
+        sectors of the groups the tickets had before, see
+        :func:`mark_sectors_dirty`.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    if mark_dirty:
+        numbers = [int(record['number']) for record in records]
+        groups = set()
+        for model in [Ticket, ArchivedTicket]:
+            groups.update(model.objects.filter(number__in=numbers).values_list('group__name', flat=True))
+        groups.update(record['group'] for record in records)
+
+    counts = upsert_tickets(records)
+    print("[", counts['created'], "created,", counts['changed'], "changed,",
+          counts['unchanged'], "unchanged ] Tickets...")
+
+    if mark_dirty and counts['created'] + counts['changed']:
+        mark_sectors_dirty(sectors_of_groups(groups))
+
+    return counts
+
+
+def reset_watermark():
+    """
+    Set the sync watermark from the stored tickets.
+
+    Returns
+    -------
+    watermark : SyncWatermark or None
+        The watermark of the most recently updated ticket,
+        or None when there is no ticket on MySQL.
+    """
+    ticket = Ticket.objects.exclude(updated_at=None).order_by('-updated_at').first()
+    if ticket is None:
+        return None
+
+    last_id = max(Ticket.objects.filter(updated_at=ticket.updated_at).values_list('id_ticket', flat=True))
+    watermark, _ = SyncWatermark.objects.update_or_create(
+        name=WATERMARK_NAME,
+        defaults={'updated_at': ticket.updated_at, 'last_id': last_id})
+    return watermark
+
+
+def updated_tickets():
+    """
+    Get the tickets changed since the last sync.
+
+    Search Zammad for the tickets updated since the
+    stored watermark, sorted by ``updated_at`` and ``id``
+    like the ``(updated_at, last_id)`` watermark, and stop at
+    the first page without a newer ticket. The watermark
+    moves forward after each stored page, so an interrupted
+    run continues from where it stopped, and only the sectors
+    of the changed tickets are marked as dirty. When there is no
+    watermark nor tickets on MySQL, it falls back to
+    :func:`all_tickets`.
+
+    Returns
+    -------
+    changed : int
+        Number of tickets created or changed by this run.
+    """
+    watermark = SyncWatermark.objects.filter(name=WATERMARK_NAME).first() or reset_watermark()
+    if watermark is None:
+        all_tickets()
+        return Ticket.objects.count()
+
+    # ``:`` é reservado na sintaxe de busca do zammad (elasticsearch)
+    since = watermark.updated_at.astimezone(pytz.UTC).strftime("%Y-%m-%dT%H:%M:%SZ").replace(":", "\\:")
+    # o id desempata os tickets do mesmo segundo, na ordem do watermark, para nenhum ficar entre duas páginas
+    params = {"query": "updated_at:>=" + since, "sort_by": "updated_at,id", "order_by": "asc,asc"}
+    changed = 0
+
+    print('FETCHING UPDATED TICKET DATA FROM ZAMMAD...')
+    with ZammadClient() as client:
+        for page, page_records in search_pages(client, params):
+            records = []
+            for record in page_records:
+                mark = (parse(record['updated_at']), int(record['id']))
+                if mark > (watermark.updated_at, watermark.last_id):
+                    records.append((mark, record))
+
+            if not records:
+                break
+
+            counts = save_tickets([record for _, record in records], mark_dirty=True)
+            watermark.updated_at, watermark.last_id = max(mark for mark, _ in records)
+            watermark.save()
+            changed += counts['created'] + counts['changed']
+
+            print("[GETTING PAGE: " + str(page) + "]")
+
+    print('END FETCHING UPDATED TICKET DATA FROM ZAMMAD...')
+    return changed
+
+
+def all_pages(client, first_page=1, last_page=None):
+    """
+    Iterate over all ticket pages of Zammad.
+
+    Parameters
+    ----------
+    client : ZammadClient
+        Client used to access the Zammad API.
+    first_page : int, optional
+        Number of the first page to be fetched.
+    last_page : int, optional
+        Number of the last page to be fetched, by default
+        it goes until the last ticket.
+
+    Yields
+    ------
+    page : int
+        Number of the page.
+    records : list of dict
+        The tickets of the page with the ``TICKET_COLUMNS`` fields.
+    """
+    for page, payload in client.iter_pages("/api/v1/tickets", {"expand": "true"}, per_page=PER_PAGE,
+                                           first_page=first_page, last_page=last_page):
+        archive_payload('tickets', payload, page)
+        yield page, [{column: ticket.get(column) for column in TICKET_COLUMNS} for ticket in payload]
+
+
+def search_pages(client, params):
+    """
+    Iterate over the pages of a ticket search.
+
+    Parameters
+    ----------
+    client : ZammadClient
+        Client used to access the Zammad API.
+    params : dict
+        Query string parameters of ``/api/v1/tickets/search``.
+
+    Yields
+    ------
+    page : int
+        Number of the page.
+    records : list of dict
+        The tickets of the page with the ``TICKET_COLUMNS`` fields.
+    """
+    lookups = load_lookups(client)
+    for page, payload in client.iter_pages("/api/v1/tickets/search", params, per_page=200,
+                                           is_empty=lambda payload: payload['tickets_count'] == 0):
+        archive_payload('search', payload, page)
+        yield page, tickets_from_search(client, payload, lookups)
 
-    print('FETCHING ALL TICKET DATA FROM ZAMMAD...')
-    while True:
-        
-        cmd =  "curl -u " + os.getenv("ZAMMAD_EMAIL") + ":" + os.getenv("ZAMMAD_PASSWORD") + " " + os.getenv("ZAMMAD_HOST") + "/api/v1/tickets?expand=true&page=" + str(page) + "&per_page=100"
 
-        args = shlex.split(cmd)
-        process = subprocess.Popen(args, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        process.wait()
+def archived_pages(entries):
+    """
+    Iterate over the ticket pages of the payload archive.
+
+    Rebuild the records exactly as :func:`all_pages`,
+    :func:`search_pages` and the webhook do, but from the
+    archived payloads, see :func:`archive.read_archive`,
+    so nothing is requested to Zammad.
+
+    Parameters
+    ----------
+    entries : iterable of dict
+        Archived payloads, in the order they were written.
+
+    Yields
+    ------
+    page : int
+        Position of the payload in the archive.
+    records : list of dict
+        The tickets of the payload with the ``TICKET_COLUMNS`` fields.
+    """
+    lookups = {field: {} for field in EXPANDED_FIELDS}
+    kinds_to_fields = {kind: field for field, kind in LOOKUP_KINDS.items()}
+    for position, entry in enumerate(entries, start=1):
+        kind, payload = entry['kind'], entry['payload']
+        if kind == 'tickets':
+            yield position, [{column: ticket.get(column) for column in TICKET_COLUMNS} for ticket in payload]
+        elif kind == 'search':
+            yield position, tickets_from_search(None, payload, lookups)
+        elif kind == 'webhook':
+            record = ticket_record(payload)
+            if record['number'] is not None and record['created_at'] is not None:
+                yield position, [record]
+        elif kind == 'ticket':
+            for field, id_field in EXPANDED_FIELDS.items():
+                if payload.get(id_field) is not None:
+                    lookups[field][payload[id_field]] = payload.get(field)
+        elif kind in kinds_to_fields:
+            lookups[kinds_to_fields[kind]].update({obj['id']: obj['name'] for obj in payload})
 
-        df_aux = pd.DataFrame(json.loads(stdout.decode()))
 
-        if len(df_aux.columns) > 52:
-            df_aux.drop(columns=df_aux.columns[-1], axis=1, inplace=True)
+def ingest(pages):
+    """
+    Store ticket pages on MySQL as they arrive.
 
-        
-        if df_aux.empty:    
-            break
+    Each page is written and dropped before the next
+    one is consumed, so the memory does not grow with
+    the number of tickets on Zammad.
 
-        df = pd.concat([df, df_aux])
+    Parameters
+    ----------
+    pages : iterable of (int, list of dict)
+        Pages yielded by :func:`all_pages` or :func:`search_pages`.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    counts = Counter()
+    for page, records in pages:
+        if records:
+            counts += save_tickets(records)
 
         print("[GETTING PAGE: " + str(page) + "]")
-        page += 1
-    
+
+    print("[ TOTAL:", counts['created'], "created,", counts['changed'], "changed,",
+          counts['unchanged'], "unchanged ]")
+    return counts
+
+
+def all_tickets():
+    """
+    Get all tickets from Zammad.
+
+    Get all tickets from Zammad using its API, and store
+    each page on MySQL as soon as it arrives, see
+    :func:`ingest`. The date strings from Zammad are
+    converted into datetime, which is needed for the MySQL.
+    Every sector is marked as dirty, so each web process
+    recomputes it.
+    """
+    print('FETCHING ALL TICKET DATA FROM ZAMMAD...')
+    with ZammadClient() as client:
+        ingest(all_pages(client))
     print('ENDED FETCHING ALL TICKET DATA FROM ZAMMAD...')
 
-    df = df[['created_at', 'close_at', 'updated_at', 'create_article_type', 'state', 'id', 'number', 'group', 'title']]
-    
-    df_records = df.to_dict('records')
+    reset_watermark()
     
-    for record in df_records:
-        ticket, created = Ticket.objects.update_or_create(
-            number=record['number'],
-            defaults={
-                'id_ticket': record['id'],
-                'number': record['number'],
-                'created_at': parse(record['created_at']) if record['created_at'] else None,
-                'close_at': parse(record['close_at']) if record['close_at'] else None,
-                'updated_at': parse(record['updated_at']) if record['updated_at'] else None,
-                'create_article_type': record['create_article_type'],
-                'state': record['state'],
-                'group': record['group'],
-                'title': record['title'],
-            })
-        if created:
-            print("[", ticket, "] Ticket added to database...")
-        else:
-            print("[", ticket, "] Ticket updated...")
-    
-    print('CALLING GET_PROCESSED_DATA_ALL...')
-    processed_data.get_processed_data_all()
-    print('ENDED CALLING GET_PROCESSED_DATA_ALL...')
+    mark_sectors_dirty(SECTORS)
 
 
-def interval_tickets(dias=120):
+def replay(since=None, until=None, truncate=False):
     """
-    Get ticket data from a date to today.
+    Rebuild the tickets from the payload archive.
 
-    Get tickets from Zammad using its API, getting it from 
-    last ``dias`` util today, then put them into a Pandas DataFrame,
-    create objects from Tickets to put data on MySQL.
-    This function also converts the date string from Zammad
-    into datetime, which is needed for the MySQL.
+    Store on MySQL the tickets of the archived payloads,
+    see :func:`archived_pages`, and their state transitions,
+    see :func:`ticket_history.replay_state_history`, reset
+    the sync watermark and mark every sector as dirty,
+    without any request to Zammad.
 
     Parameters
     ----------
-    dias : int
-        Integer that represents how many days before today
-        it will get the tickets.
-    """
-    df = pd.DataFrame()
-    page = 1
-
-    print('FETCHING TICKET DATA FROM ZAMMAD...')
-    while True:
-        cmd =  "curl -u " + os.getenv("ZAMMAD_EMAIL") + ":" + os.getenv("ZAMMAD_PASSWORD") + " " + os.getenv("ZAMMAD_HOST") + "/api/v1/tickets/search?query=" + \
-                "created_at%3A%3E" + (pd.Timestamp('now') - pd.Timedelta(days=dias)).strftime("%Y-%m-%d") + \
-                "%20OR%20updated_at%3A%3E" + (pd.Timestamp('now') - pd.Timedelta(days=dias)).strftime("%Y-%m-%d") + \
-                "%20OR%20close_at%3A%3E" + (pd.Timestamp('now') - pd.Timedelta(days=dias)).strftime("%Y-%m-%d") + \
-                "?expand=true&page=" + str(page) + "&per_page=200"
-        
-        args = shlex.split(cmd)
-        process = subprocess.Popen(args, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        process.wait()
-        
-        if json.loads(stdout.decode())['tickets_count'] == 0:
-            break
-
-        for id in json.loads(stdout.decode())['assets']['Ticket'].keys():
-            cmd_aux =  "curl -u " + os.getenv("ZAMMAD_EMAIL") + ":" + os.getenv("ZAMMAD_PASSWORD") + " " + os.getenv("ZAMMAD_HOST") + "/api/v1/tickets/" + str(id) + "?expand=true"
-        
-            args_aux = shlex.split(cmd_aux)
-            process_aux = subprocess.Popen(args_aux, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            stdout_aux, stderr_aux = process_aux.communicate()
-            process_aux.wait()
-            
-            if 'error' in json.loads(stdout_aux.decode()).keys():
-                print("Error fetching ticket by id!")
-                break
-            
-            columns_interest = ['created_at', 'close_at', 'updated_at', 'create_article_type', 'state', 'id', 'number', 'group', 'title']
-            dict_aux = {}
-            for k, v in json.loads(stdout_aux.decode()).items():
-                if k in columns_interest:
-                    dict_aux[k] = v
+    since : datetime.date, optional
+        First day of the archive to be replayed.
+    until : datetime.date, optional
+        Last day of the archive to be replayed.
+    truncate : bool, optional
+        Delete every ticket before the replay.
 
-            df_aux = pd.DataFrame([dict_aux])
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    if truncate:
+        Ticket.objects.all().delete()
+        ArchivedTicket.objects.all().delete()
+        TicketMonthlyRollup.objects.all().delete()
 
-            if len(df_aux.columns) > 52:
-                df_aux.drop(columns=df_aux.columns[-1], axis=1, inplace=True)
+    print('REPLAYING ZAMMAD ARCHIVE...')
+    counts = ingest(archived_pages(read_archive(since, until)))
+    replay_state_history(read_archive(since, until))
+    print('ENDED REPLAYING ZAMMAD ARCHIVE...')
 
-            if df_aux.empty:    
-                break
+    reset_watermark()
 
-            df = pd.concat([df, df_aux])
-        
-        if df.empty:    
-            break
+    mark_sectors_dirty(SECTORS)
 
-        print("[GETTING PAGE: " + str(page) + "]")
-        page += 1
-
-    df = df[['created_at', 'close_at', 'updated_at', 'create_article_type', 'state', 'id', 'number', 'group']]
-
-    print('END FETCHING TICKET DATA FROM ZAMMAD...')
-    if not df.empty:
-        df_records = df.to_dict('records')
-
-        for record in df_records:
-            ticket, created = Ticket.objects.update_or_create(
-                number=record['number'],
-                defaults={
-                    'id_ticket': record['id'],
-                    'number': record['number'],
-                    'created_at': parse(record['created_at']) if record['created_at'] else None,
-                    'close_at': parse(record['close_at']) if record['close_at'] else None,
-                    'updated_at': parse(record['updated_at']) if record['updated_at'] else None,
-                    'create_article_type': record['create_article_type'],
-                    'state': record['state'],
-                    'group': record['group'],
-                    'title': record['title'],
-                })
-            if created:
-                print("[", ticket, "] Ticket added to database...")
-            else:
-                print("[", ticket, "] Ticket updated...")
-
-    print('CALLING GET_PROCESSED_DATA_ALL...')
-    processed_data.get_processed_data_all()
-    print('ENDED CALLING GET_PROCESSED_DATA_ALL...')
\ No newline at end of file
+    return counts
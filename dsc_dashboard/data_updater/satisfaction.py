@@ -0,0 +1,71 @@
+import os
+from urllib.parse import quote
+
+import pandas as pd
+from django.db.models import Max
+
+from tickets.models import SatisfactionResponse
+from .data_processing.processed_data import SECTORS, mark_sectors_dirty
+
+
+def sheet_url(offset=0):
+    """
+    Build the CSV export URL of the satisfaction sheet.
+
+    Parameters
+    ----------
+    offset : int, optional
+        Number of answers to be skipped, the Google
+        Visualization query ``OFFSET`` is done by Google.
+
+    Returns
+    -------
+    url : str
+        URL of the CSV with the answers after ``offset``.
+    """
+    url = f"https://docs.google.com/spreadsheets/d/{os.getenv('GOOGLE_SHEET_ID')}/gviz/tq?tqx=out:csv&sheet={os.getenv('GOOGLE_SHEET_NAME')}"
+    if offset:
+        url += "&tq=" + quote("SELECT * OFFSET " + str(offset))
+    return url
+
+
+def sync_satisfaction():
+    """
+    Store the new answers of the satisfaction survey.
+
+    Download only the rows after the last one stored, see
+    :func:`sheet_url`. The score is the second column of the
+    sheet and the ticket number the last one, read as text;
+    the answers without a ticket number are not stored. When
+    there are new answers, every sector is marked as dirty.
+
+    Returns
+    -------
+    amount : int
+        Number of answers stored.
+    """
+    last_row = SatisfactionResponse.objects.aggregate(last_row=Max('row'))['last_row'] or 0
+    try:
+        # sem linhas novas o gviz responde um CSV vazio, sem cabeçalho
+        answers = pd.read_csv(sheet_url(last_row), dtype=str)
+    except pd.errors.EmptyDataError:
+        return 0
+    if answers.empty:
+        return 0
+
+    # a posição na planilha conta também as respostas descartadas
+    answers.index = range(last_row + 1, last_row + 1 + len(answers))
+    scores = pd.to_numeric(answers[answers.columns[1]], errors='coerce')
+    numbers = answers[answers.columns[-1]].str.strip()
+    numbers = numbers[numbers.notna() & (numbers != '')]
+    if numbers.empty:
+        return 0
+
+    SatisfactionResponse.objects.bulk_create([
+        SatisfactionResponse(row=row, number=number, score=None if pd.isna(scores[row]) else int(scores[row]))
+        for row, number in numbers.items()
+    ], ignore_conflicts=True)
+    print("[", len(numbers), "] Satisfaction answers added...")
+
+    mark_sectors_dirty(SECTORS)
+    return len(numbers)
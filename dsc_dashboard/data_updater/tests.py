@@ -0,0 +1,353 @@
+import hashlib
+import hmac
+import json
+import os
+from collections import Counter
+from concurrent.futures import Future
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+import pandas as pd
+from django.db.utils import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from tickets.models import Ticket, SectorVersion, BackfillPartition, SatisfactionResponse
+from . import backfill, data_zammad, satisfaction, ticket_store, zammad_client
+from .views import zammad_webhook
+
+SECRET = 'webhook-secret'
+
+
+@override_settings(ZAMMAD_ARCHIVE_DIR='')
+@mock.patch.dict(os.environ, {'ZAMMAD_WEBHOOK_SECRET': SECRET})
+class ZammadWebhookTest(TestCase):
+    """
+    Check the signature and the payload handling of the Zammad webhook.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.ticket = {
+            'id': 10,
+            'number': '31001',
+            'title': 'Sem acesso ao SIGAA',
+            'created_at': '2022-01-10T12:00:00Z',
+            'close_at': None,
+            'updated_at': '2022-01-10T12:30:00Z',
+            'create_article_type': 'email',
+            'state': {'name': 'open'},
+            'group': {'name': 'SIGAA'},
+        }
+
+    def post(self, body, secret=SECRET):
+        signature = "sha1=" + hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+        request = self.factory.post('/data_updater/zammad/webhook/', body,
+                                    content_type='application/json', HTTP_X_HUB_SIGNATURE=signature)
+        return zammad_webhook(request)
+
+    def test_valid_signature_stores_ticket_and_marks_sectors_dirty(self):
+        response = self.post(json.dumps({'ticket': self.ticket}).encode())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'number': '31001'})
+        ticket = Ticket.objects.get(number=31001)
+        self.assertEqual(ticket.group.name, 'SIGAA')
+        self.assertEqual(ticket.state.name, 'open')
+        versions = dict(SectorVersion.objects.values_list('sector', 'version'))
+        self.assertEqual(versions, {'diretoria': 1, 'sistemas': 1})
+
+    def test_bad_signature_is_refused(self):
+        response = self.post(json.dumps({'ticket': self.ticket}).encode(), secret='other-secret')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(SectorVersion.objects.exists())
+
+    def test_malformed_body_is_rejected(self):
+        for body in [b'not json', b'["ticket"]', b'{}', b'{"ticket": "abc"}', b'{"ticket": {"title": "x"}}']:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_invalid_ticket_fields_are_rejected(self):
+        for field, value in [('number', 'abc'), ('number', None), ('id', None), ('created_at', None),
+                             ('created_at', 'yesterday'), ('close_at', 'abc')]:
+            with self.subTest(field=field, value=value):
+                ticket = dict(self.ticket, **{field: value})
+                self.assertEqual(self.post(json.dumps({'ticket': ticket}).encode()).status_code, 400)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(SectorVersion.objects.exists())
+
+
+class InlineExecutor:
+    """
+    Run the submitted calls at once, in place of the process pool of the backfill.
+    """
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+class BackfillTest(TestCase):
+    """
+    Check the partition planning and the resume of the backfill.
+    """
+
+    def test_plan_partitions_cover_every_page(self):
+        BackfillPartition.objects.create(first_page=1, last_page=7, next_page=3)
+        client = mock.Mock()
+        client.get.return_value = [{'id': 45 * data_zammad.PER_PAGE + 1}]
+
+        backfill.plan_partitions(client, pages_per_partition=20)
+
+        partitions = list(BackfillPartition.objects.order_by('first_page')
+                          .values_list('first_page', 'last_page', 'next_page', 'done'))
+        self.assertEqual(partitions, [(1, 20, 1, False), (21, 40, 21, False), (41, 46, 41, False)])
+
+    def test_plan_partitions_without_tickets(self):
+        client = mock.Mock()
+        client.get.return_value = []
+        self.assertEqual(backfill.plan_partitions(client), [])
+
+    @mock.patch.object(backfill, 'ZammadClient', mock.MagicMock())
+    @mock.patch.object(data_zammad, 'save_tickets', return_value=Counter(created=1))
+    def test_partition_resumes_from_its_checkpoint(self, save_tickets):
+        partition = BackfillPartition.objects.create(first_page=1, last_page=5, next_page=3)
+
+        def failing_pages(client, first_page, last_page):
+            yield first_page, [{'number': first_page}]
+            raise OSError("connection lost")
+
+        with mock.patch.object(data_zammad, 'all_pages', side_effect=failing_pages):
+            with self.assertRaises(OSError):
+                backfill.backfill_partition(partition.pk)
+        partition.refresh_from_db()
+        self.assertEqual((partition.next_page, partition.done), (4, False))
+
+        def pages(client, first_page, last_page):
+            return [(page, [{'number': page}]) for page in range(first_page, last_page + 1)]
+
+        with mock.patch.object(data_zammad, 'all_pages', side_effect=pages) as all_pages:
+            counts = backfill.backfill_partition(partition.pk)
+        self.assertEqual(all_pages.call_args[0][1:], (4, 5))
+        partition.refresh_from_db()
+        self.assertEqual((partition.next_page, partition.done), (6, True))
+        self.assertEqual(counts, Counter(created=2))
+
+    @mock.patch.object(backfill, 'connections', mock.Mock())
+    @mock.patch.object(backfill, 'ProcessPoolExecutor', InlineExecutor)
+    @mock.patch.object(backfill, 'plan_partitions')
+    @mock.patch.object(backfill, 'backfill_partition', return_value=Counter(changed=1))
+    def test_backfill_fetches_only_the_pending_partitions(self, backfill_partition, plan_partitions):
+        BackfillPartition.objects.create(first_page=1, last_page=20, next_page=21, done=True)
+        pending = [BackfillPartition.objects.create(first_page=first_page, last_page=first_page + 19,
+                                                    next_page=first_page + 5).pk
+                   for first_page in [21, 41]]
+
+        counts = backfill.backfill(workers=2)
+
+        plan_partitions.assert_not_called()
+        self.assertEqual(sorted(call[0][0] for call in backfill_partition.call_args_list), sorted(pending))
+        self.assertEqual(counts, Counter(changed=2))
+
+
+class UpsertRetryTest(TransactionTestCase):
+    """
+    Check that the ticket transaction is run again after a deadlock.
+    """
+
+    def setUp(self):
+        self.record = {'id': 10, 'number': '31001', 'title': 'Sem acesso', 'created_at': '2022-01-10T12:00:00Z',
+                       'close_at': None, 'updated_at': '2022-01-10T12:30:00Z', 'create_article_type': 'email',
+                       'state': 'open', 'group': 'SIGAA'}
+
+    @mock.patch.object(ticket_store.time, 'sleep')
+    def test_deadlock_is_retried(self, sleep):
+        write_rows = ticket_store._write_rows
+        errors = [OperationalError(1213, "Deadlock found when trying to get lock")]
+
+        def flaky_write_rows(rows, batch_size):
+            if errors:
+                raise errors.pop()
+            write_rows(rows, batch_size)
+
+        with mock.patch.object(ticket_store, '_write_rows', side_effect=flaky_write_rows) as mocked:
+            counts = ticket_store.upsert_tickets([self.record])
+
+        self.assertEqual(mocked.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(counts['created'], 1)
+        self.assertTrue(Ticket.objects.filter(number=31001).exists())
+
+    @mock.patch.object(ticket_store.time, 'sleep')
+    def test_other_errors_are_raised(self, sleep):
+        error = OperationalError(2006, "MySQL server has gone away")
+        with mock.patch.object(ticket_store, '_write_rows', side_effect=error) as mocked:
+            with self.assertRaises(OperationalError):
+                ticket_store.upsert_tickets([self.record])
+        self.assertEqual(mocked.call_count, 1)
+        sleep.assert_not_called()
+
+    @mock.patch.object(ticket_store.time, 'sleep')
+    def test_persistent_deadlock_is_raised(self, sleep):
+        error = OperationalError(1205, "Lock wait timeout exceeded")
+        with mock.patch.object(ticket_store, '_write_rows', side_effect=error) as mocked:
+            with self.assertRaises(OperationalError):
+                ticket_store.upsert_tickets([self.record])
+        self.assertEqual(mocked.call_count, ticket_store.TRANSACTION_ATTEMPTS)
+
+
+class AdaptiveLimiterTest(SimpleTestCase):
+    """
+    Check how the concurrency limit follows the latency and the throttling of Zammad.
+    """
+
+    def setUp(self):
+        self.limiter = zammad_client.AdaptiveLimiter(8)
+        self.limiter.limit = 2.0
+        self.now = 1000.0
+        patcher = mock.patch.object(zammad_client.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_requests_increase_one_per_round_trip(self):
+        self.limiter.on_success(0.1, '/api/v1/tickets')
+        self.limiter.on_success(0.1, '/api/v1/tickets')
+        self.assertAlmostEqual(self.limiter.limit, 2.9)
+        for _ in range(50):
+            self.limiter.on_success(0.1, '/api/v1/tickets')
+        self.assertEqual(self.limiter.limit, 8)
+
+    def test_slow_requests_halve_once_per_round_trip(self):
+        self.limiter.limit = 8.0
+        self.limiter.on_success(0.1, '/api/v1/tickets')
+        self.now += 10
+        self.limiter.on_success(1.0, '/api/v1/tickets')
+        self.limiter.on_success(1.0, '/api/v1/tickets')
+        self.assertAlmostEqual(self.limiter.limit, 4.0)
+        self.now += 1.0
+        self.limiter.on_success(1.0, '/api/v1/tickets')
+        self.assertAlmostEqual(self.limiter.limit, 2.0)
+
+    def test_latency_baseline_is_kept_per_endpoint(self):
+        self.limiter.limit = 8.0
+        self.limiter.on_success(0.01, '/api/v1/groups')
+        self.limiter.on_success(0.01, '/api/v1/ticket_states')
+        self.limiter.on_success(0.5, '/api/v1/tickets/search')
+        self.limiter.on_success(0.6, '/api/v1/tickets/search')
+        self.assertEqual(self.limiter.limit, 8)
+        self.assertEqual(self.limiter.min_latency('/api/v1/ticket_history/12'), None)
+        self.limiter.on_success(0.2, '/api/v1/ticket_history/12')
+        self.assertEqual(self.limiter.min_latency('/api/v1/ticket_history/13'), 0.2)
+
+    def test_latency_baseline_forgets_old_requests(self):
+        self.limiter.on_success(0.01, '/api/v1/tickets')
+        for _ in range(zammad_client.LATENCY_WINDOW):
+            self.limiter.on_success(0.02, '/api/v1/tickets')
+        self.assertEqual(self.limiter.min_latency('/api/v1/tickets'), 0.02)
+
+    def test_failure_halves_and_retry_after_pauses(self):
+        self.limiter.limit = 8.0
+        self.limiter.on_failure(retry_after=5, path='/api/v1/tickets')
+        self.assertEqual(self.limiter.limit, 4)
+        self.assertEqual(self.limiter.paused_until, 1005.0)
+        self.limiter.on_failure(retry_after=1, path='/api/v1/tickets')
+        self.assertEqual(self.limiter.paused_until, 1005.0)
+
+    def test_acquire_waits_for_the_pause(self):
+        self.limiter.on_failure(retry_after=5)
+        waits = []
+
+        def wait(timeout=None):
+            waits.append(timeout)
+            self.now += timeout
+
+        with mock.patch.object(self.limiter.condition, 'wait', side_effect=wait):
+            self.limiter.acquire()
+        self.assertEqual(waits, [5.0])
+        self.assertEqual(self.limiter.in_flight, 1)
+
+
+class RetryDelayTest(SimpleTestCase):
+    """
+    Check the waits before repeating a throttled or failed request.
+    """
+
+    def response(self, retry_after=None):
+        response = mock.Mock()
+        response.headers = {} if retry_after is None else {'Retry-After': retry_after}
+        return response
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(zammad_client.retry_after_seconds(self.response('7')), 7.0)
+        self.assertEqual(zammad_client.retry_after_seconds(self.response('1.5')), 1.5)
+        self.assertEqual(zammad_client.retry_after_seconds(self.response('-3')), 0.0)
+        self.assertIsNone(zammad_client.retry_after_seconds(self.response()))
+        self.assertIsNone(zammad_client.retry_after_seconds(self.response('soon')))
+
+    def test_retry_after_date(self):
+        date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(zammad_client.retry_after_seconds(self.response(date)), 30, delta=2)
+        past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+        self.assertEqual(zammad_client.retry_after_seconds(self.response(past)), 0.0)
+
+    def test_backoff_seconds(self):
+        with mock.patch.object(zammad_client.random, 'uniform', side_effect=lambda low, high: high) as uniform:
+            self.assertEqual(zammad_client.backoff_seconds(0), zammad_client.BACKOFF_BASE)
+            self.assertEqual(zammad_client.backoff_seconds(3), zammad_client.BACKOFF_BASE * 8)
+            self.assertEqual(zammad_client.backoff_seconds(20), zammad_client.BACKOFF_MAX)
+        self.assertTrue(all(low == 0 for (low, _), _ in uniform.call_args_list))
+        for attempt in range(10):
+            self.assertTrue(0 <= zammad_client.backoff_seconds(attempt) <= zammad_client.BACKOFF_MAX)
+
+
+@mock.patch.object(satisfaction, 'mark_sectors_dirty')
+class SatisfactionSyncTest(TestCase):
+    """
+    Store the answers of a mocked satisfaction sheet.
+    """
+
+    def read_sheet(self, text):
+        read_csv = pd.read_csv
+        return mock.patch.object(satisfaction.pd, 'read_csv', side_effect=lambda url, **kwargs: read_csv(StringIO(text), **kwargs))
+
+    def test_numbers_are_kept_as_text(self, mark_sectors_dirty):
+        sheet = ("Carimbo,Nota,Comentário,Número\n"
+                 "01/02/2023,5,,31001\n"
+                 "01/02/2023,,sem nota,31002\n"
+                 "01/02/2023,3,sem número,\n"
+                 "01/02/2023,4,,  31004 \n")
+        with self.read_sheet(sheet):
+            self.assertEqual(satisfaction.sync_satisfaction(), 3)
+
+        answers = SatisfactionResponse.objects.order_by('row').values_list('row', 'number', 'score')
+        # a linha sem número é descartada, mas conta na posição da planilha
+        self.assertEqual(list(answers), [(1, '31001', 5), (2, '31002', None), (4, '31004', 4)])
+        mark_sectors_dirty.assert_called_once()
+
+    def test_rows_after_the_last_one(self, mark_sectors_dirty):
+        SatisfactionResponse.objects.create(row=7, number='31000', score=5)
+        with self.read_sheet("Carimbo,Nota,Número\n01/02/2023,2,31008\n"):
+            self.assertEqual(satisfaction.sync_satisfaction(), 1)
+        self.assertEqual(SatisfactionResponse.objects.get(row=8).number, '31008')
+
+    def test_empty_response(self, mark_sectors_dirty):
+        with self.read_sheet(""):
+            self.assertEqual(satisfaction.sync_satisfaction(), 0)
+        with self.read_sheet("Carimbo,Nota,Número\n01/02/2023,4,\n"):
+            self.assertEqual(satisfaction.sync_satisfaction(), 0)
+        self.assertFalse(SatisfactionResponse.objects.exists())
+        mark_sectors_dirty.assert_not_called()
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from tickets.models import Ticket, ArchivedTicket, TicketStateChange
+from .data_processing.state_history import CLOSED_STATES
+
+BATCH_SIZE = 1000
+
+# campos copiados entre o Ticket e o ArchivedTicket
+TICKET_FIELDS = [field.attname for field in Ticket._meta.concrete_fields if not field.primary_key]
+
+# campos das transições de estado guardadas no ArchivedTicket
+STATE_CHANGE_FIELDS = ['history_id', 'changed_at', 'from_state', 'to_state']
+
+
+def archive_tickets(days=None, batch_size=BATCH_SIZE):
+    """
+    Move the old closed tickets to the archive.
+
+    The tickets in one of the ``CLOSED_STATES`` closed more
+    than ``days`` ago go to the :class:`ArchivedTicket` table,
+    with their state transitions, and leave the Ticket table.
+    Their monthly totals stay in the rollup, so the dashboards
+    only scan the recent tickets. Each batch runs in its own
+    transaction.
+
+    Parameters
+    ----------
+    days : int, optional
+        Age of the close date of the archived tickets,
+        by default ``settings.TICKET_ARCHIVE_DAYS``.
+    batch_size : int, optional
+        Maximum number of tickets moved at a time.
+
+    Returns
+    -------
+    amount : int
+        Number of tickets archived.
+    """
+    days = settings.TICKET_ARCHIVE_DAYS if days is None else days
+    horizon = pd.Timestamp.now(tz='UTC').to_pydatetime() - timedelta(days=days)
+    old_tickets = Ticket.objects.filter(state__name__in=CLOSED_STATES, close_at__lt=horizon)
+    pks = list(old_tickets.order_by('pk').values_list('pk', flat=True))
+
+    amount = 0
+    for start in range(0, len(pks), batch_size):
+        with transaction.atomic():
+            tickets = list(old_tickets.select_for_update().filter(pk__in=pks[start:start + batch_size])
+                           .values('pk', *TICKET_FIELDS))
+            changes = defaultdict(list)
+            for change in (TicketStateChange.objects.filter(ticket_id__in=[ticket['pk'] for ticket in tickets])
+                           .order_by('changed_at').values('ticket_id', *STATE_CHANGE_FIELDS)):
+                change['changed_at'] = change['changed_at'].isoformat()
+                changes[change.pop('ticket_id')].append(change)
+
+            ArchivedTicket.objects.bulk_create([
+                ArchivedTicket(state_changes=changes[ticket.pop('pk')], **ticket) for ticket in tickets
+            ], batch_size=batch_size)
+            Ticket.objects.filter(number__in=[ticket['number'] for ticket in tickets]).delete()
+        amount += len(tickets)
+
+    print("[", amount, "] Tickets archived...")
+    return amount
+
+
+def restore_tickets(numbers, batch_size=BATCH_SIZE):
+    """
+    Move archived tickets back to the Ticket table.
+
+    Used when Zammad changes an archived ticket, e.g. when it
+    is reopened, so it is updated like any other ticket. It
+    must run in the transaction that writes the tickets.
+
+    Parameters
+    ----------
+    numbers : list of int
+        Numbers of the tickets, the ones not archived are ignored.
+    batch_size : int, optional
+        Maximum number of tickets per query.
+
+    Returns
+    -------
+    amount : int
+        Number of tickets restored.
+    """
+    amount = 0
+    for start in range(0, len(numbers), batch_size):
+        archived = list(ArchivedTicket.objects.select_for_update()
+                        .filter(number__in=numbers[start:start + batch_size])
+                        .values('state_changes', *TICKET_FIELDS))
+        if not archived:
+            continue
+
+        changes = {ticket['number']: ticket.pop('state_changes') for ticket in archived}
+        Ticket.objects.bulk_create([Ticket(**ticket) for ticket in archived])
+        pks = dict(Ticket.objects.filter(number__in=list(changes)).values_list('number', 'pk'))
+        TicketStateChange.objects.bulk_create([
+            TicketStateChange(ticket_id=pks[number], history_id=change['history_id'],
+                              changed_at=pd.Timestamp(change['changed_at']).to_pydatetime(),
+                              from_state=change['from_state'], to_state=change['to_state'])
+            for number, ticket_changes in changes.items() for change in ticket_changes
+        ])
+        ArchivedTicket.objects.filter(number__in=list(changes)).delete()
+        amount += len(archived)
+
+    return amount
+
+
+def archived_state_changes():
+    """
+    Get the state transitions of the archived tickets.
+
+    Returns
+    -------
+    changes : pd.DataFrame
+        Pandas Dataframe with the ``number`` of the ticket and the
+        ``changed_at``, ``from_state`` and ``to_state`` of each
+        state change.
+    """
+    changes = pd.DataFrame([
+        dict(change, number=number)
+        for number, ticket_changes in ArchivedTicket.objects.values_list('number', 'state_changes')
+        for change in ticket_changes
+    ], columns=['number'] + STATE_CHANGE_FIELDS)
+    changes['changed_at'] = pd.to_datetime(changes['changed_at'], utc=True)
+    return changes[['number', 'changed_at', 'from_state', 'to_state']]
@@ -0,0 +1,176 @@
+import pandas as pd
+from django.db.models import Q
+
+from tickets.models import Ticket, TicketStateChange, SyncWatermark
+from .archive import archive_payload
+from .data_processing.processed_data import mark_sectors_dirty, sectors_of_groups
+from .zammad_client import ZammadClient
+
+BATCH_SIZE = 100
+
+WATERMARK_NAME = 'ticket_history'
+
+
+def state_changes(ticket_pk, payload):
+    """
+    Get the state transitions of a ticket history.
+
+    Parameters
+    ----------
+    ticket_pk : int
+        Primary key of the Ticket.
+    payload : dict
+        Decoded response of ``/api/v1/ticket_history/{id}``.
+
+    Returns
+    -------
+    changes : pd.DataFrame
+        Pandas Dataframe with the ``ticket_id``, ``history_id``,
+        ``changed_at``, ``from_state`` and ``to_state`` of each
+        state change.
+    """
+    changes = pd.DataFrame(payload.get('history') or [],
+                           columns=['id', 'history_type', 'history_object', 'history_attribute',
+                                    'value_from', 'value_to', 'created_at'])
+    changes = changes[(changes['history_type'] == 'updated') & (changes['history_object'] == 'Ticket')
+                      & (changes['history_attribute'] == 'state')]
+
+    return pd.DataFrame({
+        'ticket_id': ticket_pk,
+        'history_id': changes['id'].astype('int64'),
+        'changed_at': pd.to_datetime(changes['created_at'], utc=True),
+        'from_state': changes['value_from'].fillna(''),
+        'to_state': changes['value_to'].fillna(''),
+    })
+
+
+def store_state_changes(changes):
+    """
+    Store the new state transitions.
+
+    The transitions already stored are skipped, using
+    the unique Zammad ``history_id``.
+
+    Parameters
+    ----------
+    changes : pd.DataFrame
+        Transitions built by :func:`state_changes`.
+
+    Returns
+    -------
+    ticket_ids : set of int
+        Primary keys of the tickets with new transitions.
+    """
+    if changes.empty:
+        return set()
+
+    stored = set(TicketStateChange.objects.filter(ticket_id__in=changes['ticket_id'].unique().tolist())
+                 .values_list('history_id', flat=True))
+    changes = changes[~changes['history_id'].isin(stored)]
+
+    TicketStateChange.objects.bulk_create([
+        TicketStateChange(ticket_id=change.ticket_id, history_id=change.history_id,
+                          changed_at=change.changed_at.to_pydatetime(),
+                          from_state=change.from_state, to_state=change.to_state)
+        for change in changes.itertuples(index=False)
+    ], ignore_conflicts=True)
+    return set(changes['ticket_id'].tolist())
+
+
+def sync_state_history(batch_size=BATCH_SIZE):
+    """
+    Get the state history of the tickets changed since the last sync.
+
+    Fetch ``/api/v1/ticket_history/{id}`` of the tickets updated
+    after the ``ticket_history`` watermark, ``batch_size`` tickets
+    at a time and concurrently, and store their state transitions,
+    see :func:`store_state_changes`. The watermark moves forward
+    after each batch, so the first run, which goes through every
+    ticket, continues from where it stopped. The sectors of the
+    tickets with new transitions are marked as dirty. Tickets
+    deleted on Zammad are skipped.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        Number of histories fetched before moving the watermark.
+
+    Returns
+    -------
+    amount : int
+        Number of tickets whose history was fetched.
+    """
+    watermark = SyncWatermark.objects.filter(name=WATERMARK_NAME).first()
+    tickets = Ticket.objects.exclude(updated_at=None).order_by('updated_at', 'pk')
+    amount = 0
+
+    print('FETCHING TICKET HISTORY FROM ZAMMAD...')
+    with ZammadClient() as client:
+        while True:
+            pending = tickets
+            if watermark is not None:
+                pending = tickets.filter(Q(updated_at__gt=watermark.updated_at)
+                                         | Q(updated_at=watermark.updated_at, pk__gt=watermark.last_id))
+            batch = list(pending.values_list('pk', 'id_ticket', 'group__name', 'updated_at')[:batch_size])
+            if not batch:
+                break
+
+            payloads = client.get_many(["/api/v1/ticket_history/" + str(id_ticket) for _, id_ticket, _, _ in batch],
+                                       ignore_missing=True)
+            changes = []
+            for (pk, id_ticket, _, _), payload in zip(batch, payloads):
+                if payload is not None:
+                    archive_payload('ticket_history', payload, id_ticket)
+                    changes.append(state_changes(pk, payload))
+
+            changed = store_state_changes(pd.concat(changes)) if changes else set()
+            if changed:
+                mark_sectors_dirty(sectors_of_groups({group for pk, _, group, _ in batch if pk in changed}))
+
+            pk, _, _, updated_at = batch[-1]
+            watermark, _ = SyncWatermark.objects.update_or_create(
+                name=WATERMARK_NAME, defaults={'updated_at': updated_at, 'last_id': pk})
+            amount += len(batch)
+            print("[ HISTORY OF", amount, "TICKETS ]")
+
+    print('ENDED FETCHING TICKET HISTORY FROM ZAMMAD...')
+    return amount
+
+
+def replay_state_history(entries, batch_size=BATCH_SIZE):
+    """
+    Store the state transitions of the archived ticket histories.
+
+    Parameters
+    ----------
+    entries : iterable of dict
+        Archived payloads, see :func:`archive.read_archive`,
+        only the ``ticket_history`` ones are used.
+    batch_size : int, optional
+        Number of histories stored at a time.
+
+    Returns
+    -------
+    amount : int
+        Number of histories replayed.
+    """
+    amount = 0
+    batch = []
+    for entry in entries:
+        if entry['kind'] == 'ticket_history':
+            batch.append(entry)
+        if len(batch) == batch_size:
+            amount += _replay_batch(batch)
+            batch = []
+
+    return amount + _replay_batch(batch)
+
+
+def _replay_batch(entries):
+    pks = dict(Ticket.objects.filter(id_ticket__in=[entry['page'] for entry in entries])
+               .values_list('id_ticket', 'pk'))
+    changes = [state_changes(pks[entry['page']], entry['payload'])
+               for entry in entries if entry['page'] in pks]
+    if changes:
+        store_state_changes(pd.concat(changes))
+    return len(changes)
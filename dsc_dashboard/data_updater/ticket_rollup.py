@@ -0,0 +1,175 @@
+import pandas as pd
+from django.db import connection, transaction
+
+from tickets.models import Ticket, ArchivedTicket, TicketGroup, TicketMonthlyRollup, TicketState
+
+ROLLUP_COLUMNS = ['opened', 'closed', 'leadtime_sum', 'leadtime_count']
+
+# nome do grupo que guarda no rollup os tickets sem grupo, nenhum grupo do zammad tem nome vazio
+NO_GROUP = ''
+
+# colunas dos tickets usadas pelo rollup
+TICKET_COLUMNS = ['group', 'state', 'created_at', 'close_at']
+
+
+def rollup_contributions(rows, states, no_group=None):
+    """
+    Count what the tickets add to the monthly rollup.
+
+    Each ticket adds one ``opened`` to the month it was
+    created and, when it has a ``close_at``, one ``closed``
+    to the month it was closed. The closed tickets also add
+    their leadtime, in whole days, to the month they were
+    closed. Merged tickets add nothing.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Pandas Dataframe with the ``TICKET_COLUMNS``, the
+        ``group`` and ``state`` as ids.
+    states : dict of {str : int}
+        Id of each state name, see :class:`TicketState`.
+    no_group : int, optional
+        Id of the ``NO_GROUP`` group, which counts the tickets
+        without group. Without it, they add nothing.
+
+    Returns
+    -------
+    contributions : pd.DataFrame
+        Pandas Dataframe with the ``ROLLUP_COLUMNS``,
+        indexed by ``group`` and ``month``.
+    """
+    if no_group is not None:
+        rows = rows.assign(group=rows['group'].fillna(no_group))
+    rows = rows[rows['group'].notna() & ~rows['state'].isin(_state_ids(states, 'merged'))]
+    if rows.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS, dtype='int64',
+                            index=pd.MultiIndex.from_arrays([[], []], names=['group', 'month']))
+
+    group = rows['group'].astype('int64')
+    created_at = pd.to_datetime(rows['created_at'], utc=True)
+    close_at = pd.to_datetime(rows['close_at'], utc=True)
+    has_close = close_at.notna()
+    leadtime = has_close & rows['state'].isin(_state_ids(states, 'closed'))
+
+    opened = created_at.groupby([group, _month(created_at)]).size()
+    closed = close_at[has_close].groupby([group[has_close], _month(close_at[has_close])]).size()
+    days = ((close_at - created_at)[leadtime] // pd.Timedelta(days=1)).groupby(
+        [group[leadtime], _month(close_at[leadtime])])
+
+    contributions = pd.concat([opened, closed, days.sum(), days.size()], axis=1, keys=ROLLUP_COLUMNS)
+    contributions.index.names = ['group', 'month']
+    return contributions.fillna(0).astype('int64')
+
+
+def update_rollup(old_rows, new_rows):
+    """
+    Move the contributions of changed tickets in the rollup.
+
+    Subtract what the stored version of the tickets added to the
+    rollup and add what the new version adds, see
+    :func:`rollup_contributions`. It must run in the transaction
+    that writes the tickets.
+
+    Parameters
+    ----------
+    old_rows : pd.DataFrame
+        The stored tickets, with the ``TICKET_COLUMNS``.
+    new_rows : pd.DataFrame
+        The new version of the tickets, with the ``TICKET_COLUMNS``.
+    """
+    states = dict(TicketState.objects.values_list('name', 'id'))
+    no_group = _no_group_id(old_rows, new_rows)
+    deltas = rollup_contributions(new_rows, states, no_group).sub(
+        rollup_contributions(old_rows, states, no_group), fill_value=0)
+    deltas = deltas[(deltas != 0).any(axis=1)].astype('int64')
+    if deltas.empty:
+        return
+
+    with connection.cursor() as cursor:
+        sql_prefix, sql_suffix = _increment_sql()
+        params = []
+        for (group, month), row in deltas.iterrows():
+            params.extend([int(group), month.date()] + [int(row[column]) for column in ROLLUP_COLUMNS])
+
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * (len(ROLLUP_COLUMNS) + 2)) + ")"] * len(deltas))
+        cursor.execute(sql_prefix + placeholders + sql_suffix, params)
+
+
+def rebuild_rollup(check=False):
+    """
+    Rebuild the monthly rollup from every ticket.
+
+    The archived tickets are counted too, see
+    :func:`ticket_archive.archive_tickets`, and the
+    tickets without group in the ``NO_GROUP`` group.
+
+    Parameters
+    ----------
+    check : bool, optional
+        Only compare the stored rollup with the tickets,
+        without writing it.
+
+    Returns
+    -------
+    mismatches : int
+        Number of ``group`` and ``month`` rows of the
+        stored rollup that did not match the tickets.
+    """
+    with transaction.atomic():
+        tickets = pd.DataFrame(list(Ticket.objects.values_list(*TICKET_COLUMNS))
+                               + list(ArchivedTicket.objects.values_list(*TICKET_COLUMNS)), columns=TICKET_COLUMNS)
+        expected = rollup_contributions(tickets, dict(TicketState.objects.values_list('name', 'id')),
+                                        _no_group_id(tickets))
+
+        stored = pd.DataFrame(list(TicketMonthlyRollup.objects.select_for_update()
+                                   .values_list('group', 'month', *ROLLUP_COLUMNS)),
+                              columns=['group', 'month'] + ROLLUP_COLUMNS)
+        stored['month'] = pd.to_datetime(stored['month'])
+        stored = stored.set_index(['group', 'month'])
+        stored = stored[(stored != 0).any(axis=1)]
+
+        differences = expected.sub(stored, fill_value=0)
+        mismatches = int((differences != 0).any(axis=1).sum())
+
+        if not check:
+            TicketMonthlyRollup.objects.all().delete()
+            TicketMonthlyRollup.objects.bulk_create([
+                TicketMonthlyRollup(group_id=group, month=month.date(),
+                                    **{column: int(row[column]) for column in ROLLUP_COLUMNS})
+                for (group, month), row in expected.iterrows()
+            ], batch_size=1000)
+
+    return mismatches
+
+
+def _no_group_id(*frames):
+    # o grupo é criado só quando algum ticket não tem grupo
+    if any(frame['group'].isna().any() for frame in frames):
+        return TicketGroup.ids([NO_GROUP])[NO_GROUP]
+    return None
+
+
+def _state_ids(states, name):
+    return [states[name]] if name in states else []
+
+
+def _month(dates):
+    return dates.dt.tz_convert(None).dt.to_period('M').dt.to_timestamp()
+
+
+def _increment_sql():
+    quote = connection.ops.quote_name
+    table = quote(TicketMonthlyRollup._meta.db_table)
+    key_columns = [quote(TicketMonthlyRollup._meta.get_field(name).column) for name in ['group', 'month']]
+    quoted_columns = [quote(column) for column in ROLLUP_COLUMNS]
+    sql_prefix = "INSERT INTO " + table + " (" + ", ".join(key_columns + quoted_columns) + ") VALUES "
+
+    if connection.vendor == 'mysql':
+        sql_suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(
+            column + " = " + column + " + VALUES(" + column + ")" for column in quoted_columns)
+    else:
+        sql_suffix = " ON CONFLICT (" + ", ".join(key_columns) + ") DO UPDATE SET " + ", ".join(
+            column + " = " + table + "." + column + " + excluded." + column for column in quoted_columns)
+
+    return sql_prefix, sql_suffix
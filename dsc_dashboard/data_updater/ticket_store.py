@@ -0,0 +1,302 @@
+import time
+from collections import Counter
+
+import pandas as pd
+from django.db import connection, transaction
+from django.db.utils import OperationalError
+
+from tickets.models import Ticket, ArchivedTicket, TicketGroup, TicketState, ArticleType
+from .ticket_archive import restore_tickets
+from .ticket_rollup import TICKET_COLUMNS as ROLLUP_TICKET_COLUMNS, update_rollup
+from .zammad_client import backoff_seconds
+
+BATCH_SIZE = 1000
+
+# erros do mysql que desfazem a transação e podem ser repetidos: deadlock e lock wait timeout
+RETRY_ERRORS = {1213, 1205}
+TRANSACTION_ATTEMPTS = 5
+
+# colunas do zammad e as respectivas colunas do model Ticket
+ZAMMAD_TO_TICKET_COLUMNS = {
+    'id': 'id_ticket',
+    'number': 'number',
+    'title': 'title',
+    'created_at': 'created_at',
+    'close_at': 'close_at',
+    'updated_at': 'updated_at',
+    'create_article_type': 'create_article_type',
+    'state': 'state',
+    'group': 'group',
+}
+
+DATE_COLUMNS = ['created_at', 'close_at', 'updated_at']
+
+# colunas guardadas como ids das tabelas de lookup
+DIMENSION_COLUMNS = {
+    'create_article_type': ArticleType,
+    'state': TicketState,
+    'group': TicketGroup,
+}
+
+HASH_COLUMN = 'content_hash'
+
+LEADTIME_COLUMN = 'leadtime_hours'
+
+
+def records_to_rows(records):
+    """
+    Convert Zammad ticket records into Ticket rows.
+
+    Parse each date column at once with ``pd.to_datetime``,
+    instead of parsing cell by cell, and rename the columns
+    to the Ticket fields. The leadtime of the closed tickets
+    is computed here, see :func:`leadtime_hours`.
+
+    Parameters
+    ----------
+    records : list of dict or pd.DataFrame
+        The tickets with the Zammad fields.
+
+    Returns
+    -------
+    rows : pd.DataFrame
+        Pandas Dataframe with one column for each Ticket field.
+    """
+    rows = pd.DataFrame(records, columns=list(ZAMMAD_TO_TICKET_COLUMNS)).rename(columns=ZAMMAD_TO_TICKET_COLUMNS)
+    rows['id_ticket'] = rows['id_ticket'].astype('int64')
+    rows['number'] = rows['number'].astype('int64')
+    rows['title'] = rows['title'].fillna('')
+
+    for column in DATE_COLUMNS:
+        rows[column] = pd.to_datetime(rows[column], utc=True)
+
+    rows[HASH_COLUMN] = content_hashes(rows)
+    rows[LEADTIME_COLUMN] = leadtime_hours(rows)
+    return rows
+
+
+def leadtime_hours(rows):
+    """
+    Compute the leadtime of the closed tickets.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Pandas Dataframe with the ``state`` name, ``created_at``
+        and ``close_at`` of the tickets.
+
+    Returns
+    -------
+    hours : pd.Series
+        Whole hours between the creation and the close of each
+        ticket in the ``closed`` state, null for the others.
+    """
+    closed = (rows['state'] == 'closed') & rows['close_at'].notna()
+    hours = (rows['close_at'] - rows['created_at']) // pd.Timedelta(hours=1)
+    return hours.where(closed).astype('Int64')
+
+
+def content_hashes(rows):
+    """
+    Hash the stored fields of each ticket.
+
+    Use ``pd.util.hash_pandas_object``, which hashes every
+    row at once with a fixed key, so the same ticket gets the
+    same hash on every run and process.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Pandas Dataframe with one column for each Ticket field.
+
+    Returns
+    -------
+    hashes : pd.Series
+        Hexadecimal hash of each row.
+    """
+    if rows.empty:
+        return pd.Series([], index=rows.index, dtype=object)
+
+    columns = list(ZAMMAD_TO_TICKET_COLUMNS.values())
+    return pd.util.hash_pandas_object(rows[columns], index=False).map('{:016x}'.format)
+
+
+def split_unchanged(rows, batch_size=BATCH_SIZE):
+    """
+    Drop the tickets whose stored hash matches.
+
+    The archived tickets are also compared, see
+    :func:`ticket_archive.archive_tickets`.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Rows built by :func:`records_to_rows`.
+    batch_size : int, optional
+        Maximum number of tickets per query.
+
+    Returns
+    -------
+    rows : pd.DataFrame
+        The new and the changed tickets.
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    stored = {}
+    numbers = rows['number'].tolist()
+    for start in range(0, len(numbers), batch_size):
+        for model in [Ticket, ArchivedTicket]:
+            stored.update(model.objects.filter(number__in=numbers[start:start + batch_size])
+                          .values_list('number', HASH_COLUMN))
+
+    stored_hashes = rows['number'].map(stored)
+    created = stored_hashes.isna()
+    unchanged = stored_hashes == rows[HASH_COLUMN]
+
+    counts = Counter(created=int(created.sum()), unchanged=int(unchanged.sum()))
+    counts['changed'] = len(rows) - counts['created'] - counts['unchanged']
+    return rows[~unchanged], counts
+
+
+def upsert_tickets(records, batch_size=BATCH_SIZE):
+    """
+    Insert or update tickets in batches.
+
+    Write the tickets with one ``INSERT ... ON DUPLICATE KEY UPDATE``
+    (``ON CONFLICT`` on other databases) per batch, using the unique
+    ``number`` to find the existing ones. All batches run inside a
+    single transaction. The tickets whose content hash did not change
+    are not written, see :func:`split_unchanged`. Each batch also
+    updates the monthly rollup, see :func:`ticket_rollup.update_rollup`,
+    so concurrent writers, e.g. the partitions of the backfill, may
+    deadlock on the same rollup rows; the transaction is then run
+    again, see :func:`retryable`.
+    The changed tickets that were archived go back to the Ticket
+    table first, see :func:`ticket_archive.restore_tickets`.
+
+    Parameters
+    ----------
+    records : list of dict or pd.DataFrame
+        The tickets with the Zammad fields.
+    batch_size : int, optional
+        Maximum number of tickets per statement.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of ``created``, ``changed`` and ``unchanged`` tickets.
+    """
+    rows = records_to_rows(records).drop_duplicates('number', keep='last')
+    if rows.empty:
+        return Counter()
+
+    rows, counts = split_unchanged(rows, batch_size)
+    if rows.empty:
+        return counts
+
+    rows = dimensions_to_ids(rows)
+    for attempt in range(TRANSACTION_ATTEMPTS):
+        try:
+            _write_rows(rows, batch_size)
+            break
+        except OperationalError as error:
+            # dentro de outra transação a repetição não vale, o mysql já desfez a transação inteira
+            if attempt == TRANSACTION_ATTEMPTS - 1 or connection.in_atomic_block or not retryable(error):
+                raise
+            print("[ RETRYING THE TICKETS AFTER:", error, "]")
+            time.sleep(backoff_seconds(attempt))
+
+    return counts
+
+
+def retryable(error):
+    """
+    Tell if a database error only aborted the transaction.
+
+    Parameters
+    ----------
+    error : OperationalError
+        The error raised by the database.
+
+    Returns
+    -------
+    bool
+        True for a deadlock or a lock wait timeout, see
+        ``RETRY_ERRORS``, after which the transaction can run again.
+    """
+    return bool(error.args) and error.args[0] in RETRY_ERRORS
+
+
+def _write_rows(rows, batch_size):
+    # grava os tickets e o rollup numa transação, repetida inteira pelo upsert_tickets
+    fields = [Ticket._meta.get_field(name)
+              for name in list(ZAMMAD_TO_TICKET_COLUMNS.values()) + [HASH_COLUMN, LEADTIME_COLUMN]]
+    columns = [field.column for field in fields]
+    sql_prefix, sql_suffix = _upsert_sql(columns)
+
+    with transaction.atomic():
+        restore_tickets(rows['number'].tolist(), batch_size)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows.iloc[start:start + batch_size]
+                stored = pd.DataFrame(list(Ticket.objects.select_for_update()
+                                           .filter(number__in=batch['number'].tolist())
+                                           .values_list(*ROLLUP_TICKET_COLUMNS)),
+                                      columns=ROLLUP_TICKET_COLUMNS)
+
+                params = []
+                for row in batch.itertuples(index=False):
+                    params.extend(field.get_db_prep_save(_to_python(value), connection)
+                                  for field, value in zip(fields, row))
+
+                placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(batch))
+                cursor.execute(sql_prefix + placeholders + sql_suffix, params)
+                update_rollup(stored, batch)
+
+
+def dimensions_to_ids(rows):
+    """
+    Replace the names of the ``DIMENSION_COLUMNS`` by their ids.
+
+    The names not stored yet are created, see :meth:`Dimension.ids`.
+    Empty names become null.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        Rows built by :func:`records_to_rows`.
+
+    Returns
+    -------
+    rows : pd.DataFrame
+        The rows with the ids of the lookup tables.
+    """
+    rows = rows.copy()
+    for column, model in DIMENSION_COLUMNS.items():
+        names = rows[column].where(rows[column] != '')
+        rows[column] = names.map(model.ids(names.dropna().unique())).astype('Int64')
+    return rows
+
+
+def _to_python(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _upsert_sql(columns):
+    quote = connection.ops.quote_name
+    table = quote(Ticket._meta.db_table)
+    quoted_columns = [quote(column) for column in columns]
+    sql_prefix = "INSERT INTO " + table + " (" + ", ".join(quoted_columns) + ") VALUES "
+
+    if connection.vendor == 'mysql':
+        sql_suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(
+            column + " = VALUES(" + column + ")" for column in quoted_columns)
+    else:
+        sql_suffix = " ON CONFLICT (" + quote('number') + ") DO UPDATE SET " + ", ".join(
+            column + " = excluded." + column for column in quoted_columns)
+
+    return sql_prefix, sql_suffix
@@ -1,23 +1,156 @@
+import time
+from datetime import datetime
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.combining import OrTrigger
 from apscheduler.triggers.cron import CronTrigger
+from django.db import connection
+from django.db.utils import OperationalError
 import pytz
 
-from .data_zammad import interval_tickets, all_tickets
+from .data_processing.processed_data import ProcessedData
+from .data_zammad import all_tickets, updated_tickets
+from .ticket_history import sync_state_history
+from .satisfaction import sync_satisfaction
+from .backlog import snapshot_backlog
+from .ticket_archive import archive_tickets
+
+REC = pytz.timezone("America/Recife")
+
+# nome do lock do mysql que elege o processo que sincroniza com o zammad
+LEADER_LOCK = 'dsc_dashboard_scheduler'
+LEADER_CHECK_SECONDS = 60
+
 
 def start():
     """
-    Call :func:`interval_tickets` periodically.
+    Call :meth:`ProcessedData.get_processed_data_dirty` periodically.
 
-    Update periodically the data for the dashboard, this
-    routine runs in background, from Monday through Friday,
-    every two hours from 6am to 6pm, based on America/Recife
-    timezone.
+    Every web process keeps its own processed data, so each
+    one checks every minute for the sectors marked as dirty
+    by the sync, see :func:`run_scheduler`, and by the Zammad
+    webhook, and recomputes them.
     """
-    REC = pytz.timezone("America/Recife")
     scheduler = BackgroundScheduler()
-    trigger = OrTrigger([CronTrigger(day_of_week='mon-fri',hour='6-18/2',timezone=REC)])
-    scheduler.add_job(all_tickets, trigger)
-    #trigger2 = OrTrigger([CronTrigger(day_of_week='sat',hour='23',timezone=REC)])
-    #scheduler.add_job(all_tickets, trigger2)
-    scheduler.start()
\ No newline at end of file
+    trigger = OrTrigger([CronTrigger(minute='*',timezone=REC)])
+    scheduler.add_job(ProcessedData().get_processed_data_dirty, trigger, max_instances=1, coalesce=True)
+    scheduler.start()
+
+
+def sync_scheduler():
+    """
+    Build the scheduler of the Zammad sync.
+
+    Every 15 minutes it gets the tickets changed since the
+    last run as a safety net for lost webhooks, five minutes
+    later the state history of the changed tickets and ten
+    minutes later the new satisfaction answers, which are also
+    fetched at start. Every Saturday at 11pm it reconciles the
+    database with a full :func:`all_tickets`, based on
+    America/Recife timezone. Every day at 23:55 UTC it takes
+    the snapshot of the backlog, see :func:`snapshot_backlog`,
+    and every Sunday at 3am it moves the old closed tickets to
+    the archive, see :func:`archive_tickets`.
+
+    Returns
+    -------
+    scheduler : BackgroundScheduler
+        The scheduler with the sync jobs, not started.
+    """
+    scheduler = BackgroundScheduler()
+    trigger = OrTrigger([CronTrigger(minute='*/15',timezone=REC)])
+    scheduler.add_job(updated_tickets, trigger, max_instances=1, coalesce=True)
+    trigger_history = OrTrigger([CronTrigger(minute='5-59/15',timezone=REC)])
+    scheduler.add_job(sync_state_history, trigger_history, max_instances=1, coalesce=True)
+    trigger_satisfaction = OrTrigger([CronTrigger(minute='10-59/15',timezone=REC)])
+    scheduler.add_job(sync_satisfaction, trigger_satisfaction, max_instances=1, coalesce=True,
+                      next_run_time=datetime.now(REC))
+    trigger2 = OrTrigger([CronTrigger(day_of_week='sat',hour='23',timezone=REC)])
+    scheduler.add_job(all_tickets, trigger2, max_instances=1, coalesce=True)
+    trigger_backlog = OrTrigger([CronTrigger(hour='23',minute='55',timezone=pytz.UTC)])
+    scheduler.add_job(snapshot_backlog, trigger_backlog, max_instances=1, coalesce=True)
+    trigger_archive = OrTrigger([CronTrigger(day_of_week='sun',hour='3',timezone=REC)])
+    scheduler.add_job(archive_tickets, trigger_archive, max_instances=1, coalesce=True)
+    return scheduler
+
+
+def acquire_leader_lock(timeout=LEADER_CHECK_SECONDS):
+    """
+    Try to become the process that runs the Zammad sync.
+
+    Use the MySQL ``GET_LOCK``, which belongs to the database
+    connection, so the lock is released as soon as the
+    leader process dies or loses its connection. Other
+    databases have no such lock, and the caller is always
+    the leader.
+
+    Parameters
+    ----------
+    timeout : int, optional
+        Seconds to wait for the lock.
+
+    Returns
+    -------
+    bool
+        True when the lock was acquired.
+    """
+    if connection.vendor != 'mysql':
+        return True
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", [LEADER_LOCK, timeout])
+        return cursor.fetchone()[0] == 1
+
+
+def holds_leader_lock():
+    """
+    Check if this process still holds the leader lock.
+
+    Returns
+    -------
+    bool
+        True when the lock belongs to the connection of this process.
+    """
+    if connection.vendor != 'mysql':
+        return True
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", [LEADER_LOCK])
+            return cursor.fetchone()[0] == 1
+    except OperationalError:
+        return False
+
+
+def run_scheduler():
+    """
+    Run the Zammad sync in a single process of the cluster.
+
+    Wait for the leader lock, see :func:`acquire_leader_lock`,
+    and then run the jobs of :func:`sync_scheduler`. The lock
+    is checked every minute, which also keeps its connection
+    alive, and when it is lost the jobs stop and this process
+    goes back to wait for it.
+    """
+    while True:
+        print('WAITING FOR THE SCHEDULER LEADER LOCK...')
+        try:
+            leader = acquire_leader_lock()
+        except OperationalError:
+            connection.close()
+            leader = False
+            time.sleep(LEADER_CHECK_SECONDS)
+
+        if not leader:
+            continue
+
+        print('STARTING THE ZAMMAD SYNC SCHEDULER...')
+        scheduler = sync_scheduler()
+        scheduler.start()
+        while holds_leader_lock():
+            time.sleep(LEADER_CHECK_SECONDS)
+
+        print('SCHEDULER LEADER LOCK LOST, STOPPING THE ZAMMAD SYNC...')
+        # espera os jobs em andamento, para não sincronizar junto com o novo líder
+        scheduler.shutdown(wait=True)
+        connection.close()
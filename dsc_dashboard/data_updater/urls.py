@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+app_name = 'data_updater'
+urlpatterns = [
+    path('zammad/webhook/', views.zammad_webhook, name='zammad_webhook'),
+]
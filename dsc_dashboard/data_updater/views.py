@@ -0,0 +1,100 @@
+import hashlib
+import hmac
+import json
+import os
+
+import pandas as pd
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import data_zammad
+from .archive import archive_payload
+
+
+def valid_signature(secret, body, signature):
+    """
+    Check the signature of a Zammad webhook.
+
+    Zammad signs the body with HMAC-SHA1 using the token
+    configured on the webhook, and sends it in the
+    ``X-Hub-Signature`` header as ``sha1=<hex digest>``.
+
+    Parameters
+    ----------
+    secret : str
+        Token configured on the Zammad webhook.
+    body : bytes
+        Raw body of the request.
+    signature : str
+        Value of the ``X-Hub-Signature`` header.
+
+    Returns
+    -------
+    bool
+        True when the signature matches the body.
+    """
+    expected = "sha1=" + hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def valid_record(record):
+    """
+    Check that a ticket record can be stored.
+
+    Parameters
+    ----------
+    record : dict
+        The ticket with the ``TICKET_COLUMNS`` fields, see
+        :func:`data_zammad.ticket_record`.
+
+    Returns
+    -------
+    bool
+        True when the ``id`` and ``number`` are integers, the
+        ``created_at`` is present and every date parses.
+    """
+    if record['created_at'] is None:
+        return False
+    try:
+        int(record['id'])
+        int(record['number'])
+        for column in ['created_at', 'close_at', 'updated_at']:
+            pd.to_datetime(record[column], utc=True)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+@csrf_exempt
+@require_POST
+def zammad_webhook(request):
+    """
+    Receive the ticket updates pushed by Zammad.
+
+    Verify the signature, store the ticket of the payload
+    and mark its sectors as dirty, so they are recomputed
+    by the next :meth:`ProcessedData.get_processed_data_dirty`.
+    The secret comes from the ``ZAMMAD_WEBHOOK_SECRET`` env
+    variable, without it every request is refused.
+    """
+    secret = os.getenv("ZAMMAD_WEBHOOK_SECRET")
+    if not secret or not valid_signature(secret, request.body, request.headers.get("X-Hub-Signature", "")):
+        return HttpResponseForbidden("Invalid signature")
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid JSON")
+    if not isinstance(payload, dict) or not isinstance(payload.get("ticket"), dict):
+        return HttpResponseBadRequest("Payload without ticket")
+
+    ticket = payload["ticket"]
+
+    archive_payload('webhook', ticket)
+    record = data_zammad.ticket_record(ticket)
+    if not valid_record(record):
+        return HttpResponseBadRequest("Incomplete ticket")
+
+    data_zammad.save_tickets([record], mark_dirty=True)
+    return JsonResponse({"number": record['number']})
@@ -0,0 +1,392 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_RETRIES = 5
+
+# respostas que indicam sobrecarga do zammad e podem ser repetidas
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# espera, em segundos, do backoff exponencial
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60
+
+# latência, em múltiplos da menor latência recente do endpoint, a partir da qual o zammad é considerado lento
+LATENCY_TOLERANCE = 3
+
+# número de latências recentes de cada endpoint de onde sai a menor latência
+LATENCY_WINDOW = 50
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the Zammad load.
+
+    Follow the AIMD rule: each fast successful request adds
+    ``1 / limit`` to the limit, so it grows by one request per
+    round trip, and a throttled, failed or slow request halves
+    it, at most once per round trip. A request is slow when
+    its latency is ``LATENCY_TOLERANCE`` times the smallest one
+    of the last ``LATENCY_WINDOW`` requests of the same endpoint,
+    see :func:`endpoint`, so the fast lookups do not make the
+    search pages look slow and an old minimum is forgotten.
+    A ``Retry-After`` pauses every request until its end.
+
+    Parameters
+    ----------
+    max_limit : int
+        Greatest number of requests in flight.
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.latencies = {}
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_flight >= max(1, int(self.limit)):
+                    self.condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def min_latency(self, path=None):
+        """
+        Smallest recent latency of the endpoint of a path, None before its first response.
+        """
+        latencies = self.latencies.get(endpoint(path))
+        return min(latencies) if latencies else None
+
+    def on_success(self, latency, path=None):
+        with self.condition:
+            latencies = self.latencies.setdefault(endpoint(path), deque(maxlen=LATENCY_WINDOW))
+            latencies.append(latency)
+
+            if latency > LATENCY_TOLERANCE * min(latencies):
+                self._decrease(latency)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def on_failure(self, retry_after=None, path=None):
+        with self.condition:
+            self._decrease(self.min_latency(path) or 0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def _decrease(self, latency):
+        # uma única redução por ida e volta, não uma por resposta em andamento
+        now = time.monotonic()
+        if now - self.last_decrease >= latency:
+            self.limit = max(1.0, self.limit / 2)
+            self.last_decrease = now
+
+
+def endpoint(path):
+    """
+    Get the endpoint of an API path.
+
+    Parameters
+    ----------
+    path : str or None
+        API path, e.g. ``/api/v1/ticket_history/123``.
+
+    Returns
+    -------
+    endpoint : str or None
+        The path with the numeric ids replaced by ``:id``,
+        e.g. ``/api/v1/ticket_history/:id``.
+    """
+    return re.sub(r'/\d+(?=/|$)', '/:id', path) if path else path
+
+
+def retry_after_seconds(response):
+    """
+    Read the ``Retry-After`` header of a response.
+
+    Parameters
+    ----------
+    response : requests.Response
+        The throttled response.
+
+    Returns
+    -------
+    seconds : float or None
+        Seconds to wait, or None when the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt):
+    """
+    Wait of an attempt, using exponential backoff with full jitter.
+
+    Parameters
+    ----------
+    attempt : int
+        Number of the failed attempt, starting at 0.
+
+    Returns
+    -------
+    seconds : float
+        Random wait between 0 and ``BACKOFF_BASE * 2 ** attempt``,
+        capped at ``BACKOFF_MAX``.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class ZammadClient:
+    """
+    HTTP client for the Zammad REST API.
+
+    Keep a single ``requests.Session`` with a connection pool,
+    so every request reuses an already open TCP/TLS connection,
+    and fetch pages concurrently using a bounded thread pool.
+    The number of requests in flight adapts to the Zammad load,
+    see :class:`AdaptiveLimiter`, and throttled or failed requests
+    are repeated after the ``Retry-After`` or a jittered backoff.
+    The counters of the run are kept in ``stats`` and printed
+    when the client is closed.
+
+    Parameters
+    ----------
+    host : str, optional
+        Zammad base URL, defaults to the ``ZAMMAD_HOST`` env variable.
+    email : str, optional
+        Zammad user, defaults to the ``ZAMMAD_EMAIL`` env variable.
+    password : str, optional
+        Zammad password, defaults to the ``ZAMMAD_PASSWORD`` env variable.
+    max_workers : int, optional
+        Maximum number of requests in flight at the same time,
+        defaults to the ``ZAMMAD_MAX_WORKERS`` env variable or 8.
+    timeout : int, optional
+        Timeout, in seconds, of each request.
+    max_retries : int, optional
+        Number of times a throttled or failed request is repeated,
+        defaults to the ``ZAMMAD_MAX_RETRIES`` env variable or 5.
+    """
+
+    def __init__(self, host=None, email=None, password=None, max_workers=None, timeout=DEFAULT_TIMEOUT,
+                 max_retries=None):
+        self.host = (host or os.getenv("ZAMMAD_HOST", "")).rstrip("/")
+        self.max_workers = max_workers or int(os.getenv("ZAMMAD_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        self.timeout = timeout
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv("ZAMMAD_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.limiter = AdaptiveLimiter(self.max_workers)
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0, 'seconds': 0.0}
+        self.stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.auth = (email or os.getenv("ZAMMAD_EMAIL"), password or os.getenv("ZAMMAD_PASSWORD"))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.stats['requests']:
+            print("[ZAMMAD STATS]", self.stats_summary())
+
+    def stats_summary(self):
+        """
+        Summarize the requests made by this client.
+
+        Returns
+        -------
+        summary : dict
+            The counters of ``stats``, the mean latency and
+            the current concurrency limit.
+        """
+        summary = dict(self.stats)
+        summary['mean_latency'] = round(summary['seconds'] / summary['requests'], 3) if summary['requests'] else 0
+        summary['concurrency'] = int(self.limiter.limit)
+        return summary
+
+    def _count(self, **counters):
+        with self.stats_lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def get(self, path, params=None):
+        """
+        Perform a GET request on the Zammad API.
+
+        Parameters
+        ----------
+        path : str
+            API path, e.g. ``/api/v1/tickets``.
+        params : dict, optional
+            Query string parameters.
+
+        Returns
+        -------
+        payload : dict or list
+            The decoded JSON response.
+
+        Raises
+        ------
+        requests.RequestException
+            When the request still fails after ``max_retries`` attempts.
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = self.session.get(self.host + path, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(requests=1, errors=1, seconds=time.monotonic() - start)
+                self.limiter.on_failure(path=path)
+                if last_attempt:
+                    raise
+                response = None
+            finally:
+                self.limiter.release()
+
+            if response is not None:
+                latency = time.monotonic() - start
+                self._count(requests=1, seconds=latency)
+                if response.status_code not in RETRY_STATUSES:
+                    self.limiter.on_success(latency, path)
+                    response.raise_for_status()
+                    return response.json()
+
+                retry_after = retry_after_seconds(response)
+                self._count(throttled=int(response.status_code == 429), errors=int(response.status_code != 429))
+                self.limiter.on_failure(retry_after, path)
+                if last_attempt:
+                    response.raise_for_status()
+                delay = retry_after if retry_after is not None else backoff_seconds(attempt)
+            else:
+                delay = backoff_seconds(attempt)
+
+            self._count(retries=1)
+            time.sleep(delay)
+
+    def get_many(self, path_list, params=None, ignore_missing=False):
+        """
+        Perform several GET requests concurrently.
+
+        Parameters
+        ----------
+        path_list : list of str
+            API paths to be requested.
+        params : dict, optional
+            Query string parameters shared by all requests.
+        ignore_missing : bool, optional
+            Return None for the paths not found, instead of raising.
+
+        Returns
+        -------
+        payloads : list
+            The decoded JSON responses, in the same order as ``path_list``.
+        """
+        def fetch(path):
+            try:
+                return self.get(path, params)
+            except requests.HTTPError as error:
+                if ignore_missing and error.response is not None and error.response.status_code == 404:
+                    return None
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fetch, path_list))
+
+    def iter_pages(self, path, params=None, per_page=100, is_empty=None, first_page=1, last_page=None):
+        """
+        Iterate over the pages of a paginated endpoint.
+
+        Keep up to ``max_workers`` pages in flight, and yield
+        them in page order. It stops at the first empty page,
+        the pages requested beyond it are discarded.
+
+        Parameters
+        ----------
+        path : str
+            API path, e.g. ``/api/v1/tickets``.
+        params : dict, optional
+            Query string parameters, ``page`` and ``per_page`` are added.
+        per_page : int, optional
+            Number of records per page.
+        is_empty : callable, optional
+            Receive a page payload and tell if it is the end of the
+            pagination, by default an empty payload ends it.
+        first_page : int, optional
+            Number of the first page to be fetched.
+        last_page : int, optional
+            Number of the last page to be fetched, by default it
+            goes until the first empty page.
+
+        Yields
+        ------
+        page : int
+            Number of the page.
+        payload : dict or list
+            The decoded JSON response of the page.
+        """
+        is_empty = is_empty or (lambda payload: not payload)
+        params = dict(params or {}, per_page=per_page)
+
+        def fetch(page):
+            return self.get(path, dict(params, page=page))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = deque()
+            next_page = first_page
+            while True:
+                if not in_flight and last_page is not None and next_page > last_page:
+                    break
+
+                while len(in_flight) < self.max_workers and (last_page is None or next_page <= last_page):
+                    in_flight.append((next_page, executor.submit(fetch, next_page)))
+                    next_page += 1
+
+                page, future = in_flight.popleft()
+                payload = future.result()
+                if is_empty(payload):
+                    for _, pending in in_flight:
+                        pending.cancel()
+                    break
+
+                yield page, payload
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.utils import DatabaseError
+
+# alias do banco somente leitura usado pelo processamento dos dashboards
+ANALYTICS_DB = 'analytics'
+
+# alias usado nas leituras da thread atual, None usa o banco principal
+_read_db = ContextVar('read_db', default=None)
+
+# comandos do status da réplica e a coluna do atraso, o primeiro só existe a partir do mysql 8.0.22
+REPLICA_STATUS_QUERIES = [
+    ("SHOW REPLICA STATUS", 'Seconds_Behind_Source'),
+    ("SHOW SLAVE STATUS", 'Seconds_Behind_Master'),
+]
+
+# avisa só na primeira falha seguida ao ler o status da réplica
+_lag_check_failed = False
+
+
+class AnalyticsRouter:
+    """
+    Send the reads of the dashboards processing to the analytics database.
+
+    Only the reads made inside :func:`analytics_reads` go to the
+    ``ANALYTICS_DB``, a read replica of the primary. The ingestion,
+    the sessions and the authentication, as well as every write,
+    stay on the ``default`` database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_db.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # a réplica recebe as tabelas pela replicação do mysql
+        return db != ANALYTICS_DB
+
+
+def replica_lag(using=ANALYTICS_DB):
+    """
+    Get how far the replica is behind the primary.
+
+    Try each of the ``REPLICA_STATUS_QUERIES``, the older
+    ``SHOW SLAVE STATUS`` is used by MySQL before 8.0.22. Both
+    need the ``REPLICATION CLIENT`` grant to the user of the
+    replica.
+
+    Parameters
+    ----------
+    using : str, optional
+        Alias of the replica database.
+
+    Returns
+    -------
+    seconds : int or None
+        Seconds behind the primary, None when the replication
+        is stopped or its status could not be read.
+    """
+    global _lag_check_failed
+    error = None
+    for query, lag_column in REPLICA_STATUS_QUERIES:
+        try:
+            with connections[using].cursor() as cursor:
+                cursor.execute(query)
+                status = cursor.fetchone()
+                columns = [column[0] for column in cursor.description or []]
+            _lag_check_failed = False
+            lag = None if status is None else dict(zip(columns, status)).get(lag_column)
+            if lag is None:
+                print('ANALYTICS REPLICA IS STOPPED, READING FROM THE PRIMARY...')
+            return lag
+        except DatabaseError as e:
+            error = e
+
+    if not _lag_check_failed:
+        _lag_check_failed = True
+        print('COULD NOT READ THE ANALYTICS REPLICA STATUS:', error,
+              '(CHECK THE REPLICATION CLIENT GRANT OF THE USER)')
+    return None
+
+
+def analytics_database():
+    """
+    Choose the database of the dashboards reads.
+
+    The ``ANALYTICS_DB`` is used when it is configured and
+    its lag is at most ``settings.ANALYTICS_MAX_LAG_SECONDS``,
+    see :func:`replica_lag`, otherwise the reads fall back
+    to the primary.
+
+    Returns
+    -------
+    alias : str
+        Alias of the database.
+    """
+    if ANALYTICS_DB not in settings.DATABASES:
+        return 'default'
+
+    if settings.DATABASES[ANALYTICS_DB]['ENGINE'] != 'django.db.backends.mysql':
+        return ANALYTICS_DB
+
+    lag = replica_lag()
+    if lag is None:
+        return 'default'
+    if lag > settings.ANALYTICS_MAX_LAG_SECONDS:
+        print('ANALYTICS REPLICA LAG IS', lag, 'SECONDS, READING FROM THE PRIMARY...')
+        return 'default'
+
+    return ANALYTICS_DB
+
+
+@contextmanager
+def analytics_reads():
+    """
+    Route the reads of the current thread to the analytics database.
+
+    The database is chosen once, when entering the block, see
+    :func:`analytics_database`, so a whole refresh reads from
+    the same database.
+
+    Yields
+    ------
+    alias : str
+        Alias of the database of the reads.
+    """
+    alias = analytics_database()
+    token = _read_db.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_db.reset(token)
@@ -117,6 +117,18 @@ DATABASES = {
     }
 }
 
+# réplica somente leitura do mysql para o processamento dos dashboards, vazio lê do banco principal
+if os.getenv('MYSQL_REPLICA_HOST'):
+    DATABASES['analytics'] = dict(DATABASES['default'],
+                                  HOST=os.getenv('MYSQL_REPLICA_HOST'),
+                                  PORT=os.getenv('MYSQL_REPLICA_PORT', os.getenv('MYSQL_PORT')),
+                                  TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['dsc_dashboard.db_router.AnalyticsRouter']
+
+# atraso máximo, em segundos, da réplica antes de voltar a ler do banco principal
+ANALYTICS_MAX_LAG_SECONDS = int(os.getenv('ANALYTICS_MAX_LAG_SECONDS', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -231,6 +243,12 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/home/user/vol/web/static/'
 MEDIA_ROOT = '/home/user/vol/web/media/'
 
+# arquivo das páginas brutas do zammad, fora do volume servido pelo nginx
+ZAMMAD_ARCHIVE_DIR = os.getenv('ZAMMAD_ARCHIVE_DIR', '/home/user/vol/archive/')
+
+# idade, em dias, do fechamento dos tickets movidos para o arquivo (maior que a janela de 210 dias do leadtime)
+TICKET_ARCHIVE_DAYS = int(os.getenv('TICKET_ARCHIVE_DAYS', 365))
+
 
 #STATICFILES_DIRS = [
 #    BASE_DIR / 'static',
@@ -0,0 +1,145 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db.utils import DatabaseError, ProgrammingError
+from django.test import SimpleTestCase, override_settings
+
+from . import db_router
+from .db_router import ANALYTICS_DB, AnalyticsRouter, analytics_reads
+
+
+class FakeCursor:
+    """
+    Cursor that answers the replica status queries from a dict.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.description = None
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query):
+        result = self.results[query]
+        if isinstance(result, Exception):
+            raise result
+        if result is not None:
+            self.description = [(column, None) for column in result]
+            self.row = tuple(result.values())
+
+    def fetchone(self):
+        return self.row
+
+
+@mock.patch.object(db_router, '_lag_check_failed', False)
+@mock.patch('builtins.print')
+class ReplicaLagTest(SimpleTestCase):
+    """
+    Read the lag of the replica from ``SHOW REPLICA STATUS`` or ``SHOW SLAVE STATUS``.
+    """
+
+    def replica(self, results):
+        connection = mock.Mock()
+        connection.cursor.side_effect = lambda: FakeCursor(results)
+        return mock.patch.object(db_router, 'connections', {ANALYTICS_DB: connection})
+
+    def test_replica_status(self, print_):
+        with self.replica({"SHOW REPLICA STATUS": {'Replica_IO_Running': 'Yes', 'Seconds_Behind_Source': 4}}):
+            self.assertEqual(db_router.replica_lag(), 4)
+        print_.assert_not_called()
+
+    def test_slave_status_before_mysql_8_0_22(self, print_):
+        with self.replica({"SHOW REPLICA STATUS": ProgrammingError(1064, "You have an error in your SQL syntax"),
+                           "SHOW SLAVE STATUS": {'Slave_IO_Running': 'Yes', 'Seconds_Behind_Master': 12}}):
+            self.assertEqual(db_router.replica_lag(), 12)
+        print_.assert_not_called()
+
+    def test_stopped_replication(self, print_):
+        with self.replica({"SHOW REPLICA STATUS": {'Replica_IO_Running': 'No', 'Seconds_Behind_Source': None}}):
+            self.assertIsNone(db_router.replica_lag())
+        with self.replica({"SHOW REPLICA STATUS": None}):
+            self.assertIsNone(db_router.replica_lag())
+
+    def test_failed_check_is_printed_once(self, print_):
+        denied = DatabaseError(1227, "Access denied; you need the REPLICATION CLIENT privilege")
+        with self.replica({"SHOW REPLICA STATUS": denied, "SHOW SLAVE STATUS": denied}):
+            self.assertIsNone(db_router.replica_lag())
+            self.assertIsNone(db_router.replica_lag())
+        self.assertEqual(print_.call_count, 1)
+
+        # depois de uma leitura bem sucedida, a próxima falha volta a ser avisada
+        with self.replica({"SHOW REPLICA STATUS": {'Seconds_Behind_Source': 0}}):
+            self.assertEqual(db_router.replica_lag(), 0)
+        with self.replica({"SHOW REPLICA STATUS": denied, "SHOW SLAVE STATUS": denied}):
+            self.assertIsNone(db_router.replica_lag())
+        self.assertEqual(print_.call_count, 2)
+
+
+@override_settings(ANALYTICS_MAX_LAG_SECONDS=60)
+@mock.patch('builtins.print')
+class AnalyticsRouterTest(SimpleTestCase):
+    """
+    Route the reads inside :func:`analytics_reads` by the lag of the replica.
+    """
+
+    def setUp(self):
+        self.router = AnalyticsRouter()
+
+    def analytics(self, engine='django.db.backends.mysql'):
+        return mock.patch.dict(settings.DATABASES, {ANALYTICS_DB: {'ENGINE': engine}})
+
+    def reads(self, lag):
+        with mock.patch.object(db_router, 'replica_lag', return_value=lag) as replica_lag:
+            with analytics_reads() as alias:
+                self.assertEqual(self.router.db_for_read(None), alias)
+        self.assertIsNone(self.router.db_for_read(None))
+        return alias, replica_lag
+
+    def test_without_replica(self, print_):
+        with mock.patch.dict(settings.DATABASES):
+            settings.DATABASES.pop(ANALYTICS_DB, None)
+            alias, replica_lag = self.reads(0)
+        self.assertEqual(alias, 'default')
+        replica_lag.assert_not_called()
+
+    def test_replica_up_to_date(self, print_):
+        with self.analytics():
+            self.assertEqual(self.reads(60)[0], ANALYTICS_DB)
+
+    def test_replica_behind(self, print_):
+        with self.analytics():
+            self.assertEqual(self.reads(61)[0], 'default')
+            self.assertEqual(self.reads(None)[0], 'default')
+
+    def test_replica_not_mysql(self, print_):
+        with self.analytics('django.db.backends.sqlite3'):
+            alias, replica_lag = self.reads(None)
+        self.assertEqual(alias, ANALYTICS_DB)
+        replica_lag.assert_not_called()
+
+    def test_reads_are_reset_after_an_error(self, print_):
+        with self.analytics(), mock.patch.object(db_router, 'replica_lag', return_value=0):
+            with self.assertRaises(ValueError):
+                with analytics_reads():
+                    raise ValueError
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_nested_reads(self, print_):
+        with self.analytics(), mock.patch.object(db_router, 'replica_lag', side_effect=[0, 61]):
+            with analytics_reads():
+                with analytics_reads():
+                    self.assertEqual(self.router.db_for_read(None), 'default')
+                self.assertEqual(self.router.db_for_read(None), ANALYTICS_DB)
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_writes_and_migrations(self, print_):
+        with self.analytics(), mock.patch.object(db_router, 'replica_lag', return_value=0):
+            with analytics_reads():
+                self.assertEqual(self.router.db_for_write(None), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'tickets'))
+        self.assertFalse(self.router.allow_migrate(ANALYTICS_DB, 'tickets'))
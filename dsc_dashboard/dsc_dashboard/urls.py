@@ -24,6 +24,7 @@ urlpatterns = [
     path('', include(('dashboards.urls', 'dashboards'), namespace='dashboards')),
     #path('painel_matricula/', include(('painel_matricula.urls', 'painel_matricula'), namespace='painel_matricula')),
     path('accounts/', include('accounts.urls')),
+    path('data_updater/', include(('data_updater.urls', 'data_updater'), namespace='data_updater')),
 ]
 
 
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:12
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def drop_duplicate_numbers(apps, schema_editor):
+    # o sync antigo, sem upsert, podia gravar o mesmo ticket mais de uma vez; fica só a linha mais recente
+    Ticket = apps.get_model('tickets', 'Ticket')
+    duplicates = (Ticket.objects.values('number').annotate(amount=Count('id'))
+                  .filter(amount__gt=1).values_list('number', flat=True))
+    for number in list(duplicates):
+        ids = list(Ticket.objects.filter(number=number)
+                   .order_by(F('updated_at').desc(nulls_last=True), '-id').values_list('id', flat=True))
+        Ticket.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ticket',
+            name='number',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_sectorversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_page', models.PositiveIntegerField(unique=True)),
+                ('last_page', models.PositiveIntegerField()),
+                ('next_page', models.PositiveIntegerField()),
+                ('done', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
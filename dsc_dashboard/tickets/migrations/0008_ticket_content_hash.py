@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_backfillpartition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketStateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('history_id', models.BigIntegerField(unique=True)),
+                ('changed_at', models.DateTimeField()),
+                ('from_state', models.CharField(max_length=50)),
+                ('to_state', models.CharField(max_length=50)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_changes', to='tickets.ticket')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticketstatechange',
+            index=models.Index(fields=['ticket', 'changed_at'], name='tickets_tic_ticket__f4517e_idx'),
+        ),
+    ]
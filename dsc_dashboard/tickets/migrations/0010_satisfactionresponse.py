@@ -0,0 +1,22 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_ticketstatechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SatisfactionResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField(unique=True)),
+                ('number', models.CharField(db_index=True, max_length=50)),
+                ('score', models.PositiveSmallIntegerField(blank=True, null=True)),
+            ],
+        ),
+    ]
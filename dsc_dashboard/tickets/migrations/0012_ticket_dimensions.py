@@ -0,0 +1,175 @@
+# Generated by Django 3.2.15 on 2026-10-17 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# campos de texto repetidos do ticket e os models das suas tabelas de lookup
+DIMENSIONS = {
+    'create_article_type': 'ArticleType',
+    'state': 'TicketState',
+    'group': 'TicketGroup',
+}
+
+
+def names_to_ids(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    for field, model_name in DIMENSIONS.items():
+        model = apps.get_model('tickets', model_name)
+        for name in Ticket.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct():
+            dimension = model.objects.create(name=name)
+            Ticket.objects.filter(**{field: name}).update(**{field + '_new': dimension})
+
+
+def ids_to_names(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    for field, model_name in DIMENSIONS.items():
+        model = apps.get_model('tickets', model_name)
+        for dimension in model.objects.all():
+            Ticket.objects.filter(**{field + '_new': dimension}).update(**{field: dimension.name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleType',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketGroup',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketState',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_group_created_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_group_close_at_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_state_group_idx',
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='create_article_type_new',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tickets.articletype'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='state_new',
+            field=models.ForeignKey(blank=True, null=True, db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tickets.ticketstate'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='group_new',
+            field=models.ForeignKey(blank=True, null=True, db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tickets.ticketgroup'),
+        ),
+        migrations.RunPython(names_to_ids, ids_to_names),
+        migrations.AlterField(
+            model_name='ticket',
+            name='create_article_type',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='state',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='group',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='ticket',
+            name='create_article_type',
+        ),
+        migrations.RemoveField(
+            model_name='ticket',
+            name='state',
+        ),
+        migrations.RemoveField(
+            model_name='ticket',
+            name='group',
+        ),
+        migrations.RenameField(
+            model_name='ticket',
+            old_name='create_article_type_new',
+            new_name='create_article_type',
+        ),
+        migrations.RenameField(
+            model_name='ticket',
+            old_name='state_new',
+            new_name='state',
+        ),
+        migrations.RenameField(
+            model_name='ticket',
+            old_name='group_new',
+            new_name='group',
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='create_article_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='tickets.articletype'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='state',
+            field=models.ForeignKey(blank=True, null=True, db_index=False, on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketstate'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, db_index=False, on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketgroup'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='id_ticket',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='number',
+            field=models.BigIntegerField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['group', 'created_at'], name='ticket_group_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['group', 'close_at'], name='ticket_group_close_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['state', 'group'], name='ticket_state_group_idx'),
+        ),
+    ]
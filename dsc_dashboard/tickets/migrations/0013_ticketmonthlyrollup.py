@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-17 17:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0012_ticket_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('opened', models.IntegerField(default=0)),
+                ('closed', models.IntegerField(default=0)),
+                ('leadtime_sum', models.BigIntegerField(default=0)),
+                ('leadtime_count', models.IntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketgroup')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketmonthlyrollup',
+            constraint=models.UniqueConstraint(fields=('group', 'month'), name='rollup_group_month_unique'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.15 on 2026-10-17 17:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0013_ticketmonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BacklogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('amount', models.PositiveIntegerField()),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketgroup')),
+                ('state', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketstate')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='backlogsnapshot',
+            constraint=models.UniqueConstraint(fields=('date', 'group', 'state'), name='backlog_date_group_state_unique'),
+        ),
+    ]
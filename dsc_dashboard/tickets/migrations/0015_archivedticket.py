@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-17 17:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0014_backlogsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_ticket', models.PositiveIntegerField()),
+                ('number', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=1000)),
+                ('created_at', models.DateTimeField()),
+                ('close_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=16)),
+                ('state_changes', models.JSONField(default=list)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('create_article_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='tickets.articletype')),
+                ('group', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketgroup')),
+                ('state', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='tickets.ticketstate')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
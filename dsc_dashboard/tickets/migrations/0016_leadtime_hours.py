@@ -0,0 +1,38 @@
+# Generated by Django 3.2.15 on 2026-10-17 17:39
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_leadtime_hours(apps, schema_editor):
+    # horas inteiras entre a abertura e o fechamento dos tickets fechados
+    for model_name in ['Ticket', 'ArchivedTicket']:
+        model = apps.get_model('tickets', model_name)
+        tickets = model.objects.filter(state__name='closed').exclude(close_at=None)
+        updated = [model(id=id, leadtime_hours=(close_at - created_at) // timedelta(hours=1))
+                   for id, created_at, close_at in tickets.values_list('id', 'created_at', 'close_at').iterator()]
+        model.objects.bulk_update(updated, ['leadtime_hours'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0015_archivedticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedticket',
+            name='leadtime_hours',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='leadtime_hours',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_leadtime_hours, migrations.RunPython.noop),
+    ]
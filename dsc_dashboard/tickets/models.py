@@ -1,16 +1,248 @@
 from django.db import models
 
-class Ticket(models.Model):
+
+class Dimension(models.Model):
+    """
+    Value of a column repeated by many tickets, such as its group.
+
+    The tickets keep the small integer id of the value,
+    instead of repeating the string on every row.
+    """
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def ids(cls, names):
+        """
+        Get the ids of the names, creating the missing ones.
+
+        Parameters
+        ----------
+        names : iterable of str
+            Values of the column.
+
+        Returns
+        -------
+        ids : dict of {str : int}
+            Id of each name.
+        """
+        names = set(names)
+        ids = dict(cls.objects.filter(name__in=names).values_list('name', 'id'))
+        missing = names - set(ids)
+        if missing:
+            cls.objects.bulk_create([cls(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(cls.objects.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+
+    def __str__(self):
+        return self.name
+
+
+class TicketGroup(Dimension):
+    pass
+
+
+class TicketState(Dimension):
+    pass
+
+
+class ArticleType(Dimension):
+    pass
+
+
+class TicketManager(models.Manager):
+    """
+    Leave the ``title`` out of the loaded tickets, it is
+    only shown in the tables of old open tickets.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('title')
+
+
+class BaseTicket(models.Model):
     
-    id_ticket = models.CharField(max_length=50)
-    number = models.CharField(max_length=50)
+    id_ticket = models.PositiveIntegerField()
+    number = models.BigIntegerField(unique=True)
     title = models.CharField(max_length=1000)
     created_at = models.DateTimeField()
     close_at = models.DateTimeField(blank=True, null=True)
     updated_at = models.DateTimeField(blank=True, null=True)
-    create_article_type = models.CharField(max_length=50)
-    state = models.CharField(max_length=50)
-    group = models.CharField(max_length=50)
+    # os índices compostos do Ticket já cobrem group e state
+    create_article_type = models.ForeignKey(ArticleType, on_delete=models.PROTECT, blank=True, null=True)
+    state = models.ForeignKey(TicketState, on_delete=models.PROTECT, blank=True, null=True, db_index=False)
+    group = models.ForeignKey(TicketGroup, on_delete=models.PROTECT, blank=True, null=True, db_index=False)
+    content_hash = models.CharField(max_length=16, blank=True, default='')
+    # horas entre a abertura e o fechamento, calculadas na ingestão, só para os tickets fechados
+    leadtime_hours = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"Number: { self.number } - Title: {self.title} - State: { self.state } - Group: { self.group }"
+
+
+class Ticket(BaseTicket):
+
+    objects = TicketManager()
+
+    class Meta:
+        # filtros usados pelos setores em data_processing
+        indexes = [
+            models.Index(fields=['group', 'created_at'], name='ticket_group_created_at_idx'),
+            models.Index(fields=['group', 'close_at'], name='ticket_group_close_at_idx'),
+            models.Index(fields=['state', 'group'], name='ticket_state_group_idx'),
+            models.Index(fields=['created_at'], name='ticket_created_at_idx'),
+            models.Index(fields=['close_at'], name='ticket_close_at_idx'),
+            models.Index(fields=['updated_at'], name='ticket_updated_at_idx'),
+        ]
+
+
+class ArchivedTicket(BaseTicket):
+    """
+    Ticket closed before the archive horizon.
+
+    Moved out of the Ticket table by
+    :func:`data_updater.ticket_archive.archive_tickets`, with its
+    state transitions kept in ``state_changes``, so the scans of
+    the dashboards only go through the recent tickets. Its
+    monthly totals stay in the :class:`TicketMonthlyRollup`.
+    """
+    state_changes = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+class SyncWatermark(models.Model):
+    """
+    High-water mark of a Zammad sync.
+
+    Keep the greatest ``updated_at`` already synced and the
+    id of the last ticket with it, so the next run only asks
+    Zammad for the tickets changed after them.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    updated_at = models.DateTimeField()
+    last_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Sync: { self.name } - Updated at: { self.updated_at } - Last id: { self.last_id }"
+
+
+class SectorVersion(models.Model):
+    """
+    Version of the processed data of a dashboard sector.
+
+    It is incremented whenever tickets of the sector change,
+    then each process recomputes only the sectors whose
+    version is newer than the one it has computed.
+    """
+    sector = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sector: { self.sector } - Version: { self.version }"
+
+
+class BackfillPartition(models.Model):
+    """
+    Checkpoint of a partition of the full ticket backfill.
+
+    Each partition covers a range of pages of ``/api/v1/tickets``
+    and keeps the next page to be fetched, so a restarted
+    backfill resumes every partition where it stopped.
+    """
+    first_page = models.PositiveIntegerField(unique=True)
+    last_page = models.PositiveIntegerField()
+    next_page = models.PositiveIntegerField()
+    done = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pages: { self.first_page }-{ self.last_page } - Next page: { self.next_page } - Done: { self.done }"
+
+
+class TicketStateChange(models.Model):
+    """
+    State transition of a ticket, taken from the Zammad history.
+
+    Only the ``state`` changes are kept, the state of a ticket
+    before its first change is the ``from_state`` of it.
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='state_changes')
+    history_id = models.BigIntegerField(unique=True)
+    changed_at = models.DateTimeField()
+    from_state = models.CharField(max_length=50)
+    to_state = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [models.Index(fields=['ticket', 'changed_at'])]
+
+    def __str__(self):
+        return f"Ticket: { self.ticket_id } - { self.from_state } -> { self.to_state } - Changed at: { self.changed_at }"
+
+
+class SatisfactionResponse(models.Model):
+    """
+    Answer of the satisfaction survey (Google Forms).
+
+    ``row`` is the position of the answer in the sheet, so
+    the sync only downloads the rows after the last one stored.
+    """
+    row = models.PositiveIntegerField(unique=True)
+    number = models.CharField(max_length=50, db_index=True)
+    score = models.PositiveSmallIntegerField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Row: { self.row } - Number: { self.number } - Score: { self.score }"
+
+
+class TicketMonthlyRollup(models.Model):
+    """
+    Monthly totals of the tickets of a Zammad group.
+
+    Kept up to date by every upsert of tickets, see
+    :func:`data_updater.ticket_rollup.update_rollup`, so the
+    monthly charts read a few rows instead of every ticket.
+    ``month`` is the first day of the month (UTC), and the
+    leadtime, in days, counts only the closed tickets.
+    Merged tickets are not counted, and the tickets without
+    group are counted in the group named ``NO_GROUP``.
+    """
+    group = models.ForeignKey(TicketGroup, on_delete=models.PROTECT)
+    month = models.DateField()
+    opened = models.IntegerField(default=0)
+    closed = models.IntegerField(default=0)
+    leadtime_sum = models.BigIntegerField(default=0)
+    leadtime_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['group', 'month'], name='rollup_group_month_unique')]
+
+    def __str__(self):
+        return f"Group: { self.group_id } - Month: { self.month } - Opened: { self.opened } - Closed: { self.closed }"
+
+
+class BacklogSnapshot(models.Model):
+    """
+    Tickets of a group in a backlog state at the end of a day (UTC).
+
+    Taken every day by :func:`data_updater.backlog.snapshot_backlog`,
+    and rebuilt for the days before it from the state history by
+    :func:`data_updater.backlog.backfill_backlog`. ``state`` is null
+    for tickets closed without a state history, whose state before
+    closing is unknown.
+    """
+    date = models.DateField()
+    group = models.ForeignKey(TicketGroup, on_delete=models.PROTECT)
+    state = models.ForeignKey(TicketState, on_delete=models.PROTECT, blank=True, null=True)
+    amount = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['date', 'group', 'state'], name='backlog_date_group_state_unique')]
+
+    def __str__(self):
+        return f"Date: { self.date } - Group: { self.group_id } - State: { self.state_id } - Amount: { self.amount }"
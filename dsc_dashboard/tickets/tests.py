@@ -1,3 +1,322 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+import pandas as pd
+import pytz
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from data_updater import ticket_rollup
+from data_updater.data_processing import ticket_queries
+from data_updater.data_processing.constant_utils import AMOUNT_MONTHS_IN_DAYS
+from data_updater.data_processing.refresh_context import (LEADTIME_DAYS, OLD_TICKET_DAYS, WEEKDAY_HOUR_DAYS, RefreshContext,
+                                                           load_tickets_frame)
+from data_updater.data_processing.state_history import CLOSED_STATES, load_state_history, state_intervals, daily_backlog_by
+from tickets.models import (Ticket, ArchivedTicket, TicketGroup, TicketState, ArticleType, SatisfactionResponse,
+                            TicketStateChange, BacklogSnapshot)
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), "Query plan assertions only for MySQL and SQLite")
+class TicketQueryPlanTest(TestCase):
+    """
+    Check that the hot queries of ``data_processing`` can use the Ticket indexes.
+
+    On MySQL the index must be among the ``possible_keys`` of the
+    plan, since with few rows the optimizer may still prefer a scan.
+    """
+
+    def setUp(self):
+        self.date = datetime(2022, 1, 31, 23, 59, 59, tzinfo=pytz.UTC)
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        for index_name in index_names:
+            self.assertIn(index_name, plan)
+
+    def test_old_open_tickets(self):
+        self.assertUsesIndex(ticket_queries.old_open_tickets(self.date - timedelta(days=OLD_TICKET_DAYS)),
+                             'ticket_created_at_idx')
+
+    def test_window_tickets(self):
+        self.assertUsesIndex(ticket_queries.window_tickets(self.date - timedelta(days=AMOUNT_MONTHS_IN_DAYS)),
+                             'ticket_created_at_idx', 'ticket_close_at_idx')
+
+    def test_closed_totals(self):
+        self.assertUsesIndex(ticket_queries.closed_counts(), 'ticket_state_group_idx')
+
+    def test_tickets_by_weekday_and_hour(self):
+        self.assertUsesIndex(ticket_queries.weekday_and_hour_counts(self.date - timedelta(days=WEEKDAY_HOUR_DAYS)),
+                             'ticket_created_at_idx')
+
+    def test_leadtime(self):
+        self.assertUsesIndex(ticket_queries.leadtime_tickets(self.date - timedelta(days=LEADTIME_DAYS)),
+                             'ticket_close_at_idx')
+
+    def test_upsert_lookup_by_number(self):
+        self.assertUsesIndex(Ticket.objects.filter(number__in=[1001, 1002]), 'number')
+
+
+class TicketQueriesParityTest(TestCase):
+    """
+    Check that the aggregates of ``ticket_queries`` counted by the
+    database match the same aggregates counted by pandas.
+    """
+
+    def setUp(self):
+        self.since = datetime(2022, 1, 1, tzinfo=pytz.UTC)
+        groups = {name: TicketGroup.objects.create(name=name) for name in ["Triagem", "SIGAA"]}
+        states = {name: TicketState.objects.create(name=name) for name in ["open", "closed", "merged"]}
+        types = {name: ArticleType.objects.create(name=name) for name in ["web", "phone"]}
+        tickets = [
+            # número, grupo, estado, tipo, criação, fechamento
+            (1, "Triagem", "open", "web", datetime(2022, 1, 3, 1, 30), None),
+            (2, "Triagem", "closed", "phone", datetime(2022, 1, 3, 14, 0), datetime(2022, 1, 4)),
+            (3, "Triagem", "merged", "web", datetime(2022, 1, 5, 9, 0), None),
+            (4, "SIGAA", "closed", "web", datetime(2021, 11, 2, 10, 0), datetime(2022, 1, 9)),
+            (5, "SIGAA", "open", None, datetime(2022, 1, 9, 23, 59), None),
+            (6, None, "closed", "web", datetime(2022, 1, 9, 12, 0), datetime(2022, 1, 10)),
+            (7, "SIGAA", "closed", "web", datetime(2021, 10, 1), datetime(2021, 12, 1)),
+            # aberto há exatamente OLD_TICKET_DAYS em self.now, fica de fora dos tickets antigos
+            (8, "SIGAA", "open", "web", datetime(2021, 12, 20, 12, 0), None),
+            (9, None, "open", "phone", datetime(2021, 12, 1), None),
+            # fechado exatamente no início da janela
+            (10, "Triagem", "closed", "web", datetime(2021, 12, 1), datetime(2022, 1, 1)),
+        ]
+        for number, group, state, article_type, created_at, close_at in tickets:
+            Ticket.objects.create(id_ticket=number, number=number, title="", group=groups.get(group),
+                                  state=states[state], create_article_type=types.get(article_type),
+                                  created_at=created_at.replace(tzinfo=pytz.UTC),
+                                  close_at=close_at and close_at.replace(tzinfo=pytz.UTC))
+        for number, group in [(11, "SIGAA"), (12, None)]:
+            ArchivedTicket.objects.create(id_ticket=number, number=number, title="", group=groups.get(group),
+                                          state=states["closed"], created_at=datetime(2021, 10, 4, tzinfo=pytz.UTC),
+                                          close_at=datetime(2021, 10, 5, tzinfo=pytz.UTC))
+        self.now = datetime(2022, 1, 9, 12, 0)
+        # a última resposta de cada ticket é a que vale
+        answers = [(1, "1", 3), (2, "1", 9), (3, "2", 10), (4, "3", 5), (5, "4", 7), (6, "5", None),
+                   (7, "6", 8), (8, "7", 2)]
+        for row, number, score in answers:
+            SatisfactionResponse.objects.create(row=row, number=number, score=score)
+        self.tickets = load_tickets_frame(ticket_queries.window_tickets(self.since))
+        self.all_tickets = load_tickets_frame(Ticket.objects.all())
+        self.archived_tickets = load_tickets_frame(ArchivedTicket.objects.all())
+
+    def assertSameTotals(self, database, frame):
+        # os tickets sem grupo ficam com None no banco e NaN no pandas
+        frame = {None if pd.isna(group) else group: amount for group, amount in frame.items()}
+        self.assertIn(None, frame)
+        self.assertEqual(database.to_dict(), frame)
+
+    def assertSameCounts(self, database, frame):
+        columns = list(database.columns)
+        database = database.astype({'group': str}).sort_values(columns).reset_index(drop=True)
+        frame = frame.astype({'group': str}).sort_values(columns).reset_index(drop=True)
+        self.assertGreater(len(database), 0)
+        self.assertTrue(database.equals(frame), f"\n{database}\n{frame}")
+
+    def test_satisfaction_by_group(self):
+        self.assertSameCounts(ticket_queries.satisfaction_by_group(self.since),
+                              ticket_queries.satisfaction_by_group_frame(self.tickets, RefreshContext().satisfaction_scores))
+
+    def test_satisfaction_counts(self):
+        counts = RefreshContext().satisfaction_scores.value_counts()
+        self.assertEqual(ticket_queries.satisfaction_counts().to_dict(), {int(score): amount for score, amount in counts.items()})
+
+    def test_tickets_by_weekday_and_hour(self):
+        self.assertSameCounts(ticket_queries.tickets_by_weekday_and_hour(self.since),
+                              ticket_queries.tickets_by_weekday_and_hour_frame(self.tickets, self.since))
+
+    def test_window_tickets(self):
+        tickets = self.all_tickets
+        expected = tickets[(tickets['created_at'] >= self.since) | (tickets['close_at'] >= self.since)]
+        self.assertIn(10, list(expected['number']))
+        self.assertEqual(sorted(self.tickets['number']), sorted(expected['number']))
+
+    def test_old_open_tickets(self):
+        context = RefreshContext()
+        context.now = self.now
+        tickets = self.all_tickets
+        before = pd.Timestamp(self.now, tz='UTC') - pd.Timedelta(days=OLD_TICKET_DAYS)
+        expected = tickets[tickets['state'].notna() & ~tickets['state'].isin(CLOSED_STATES) & (tickets['created_at'] < before)]
+        self.assertEqual(sorted(context.old_open_tickets['number']), sorted(expected['number']))
+        self.assertNotIn(8, list(context.old_open_tickets['number']))
+        self.assertIn(9, list(context.old_open_tickets['number']))
+
+    def test_closed_totals(self):
+        tickets = pd.concat([self.all_tickets, self.archived_tickets], ignore_index=True)
+        tickets = tickets[tickets['state'] == 'closed']
+        self.assertSameTotals(ticket_queries.closed_totals(), tickets['group'].astype(object).value_counts(dropna=False))
+
+    def test_open_totals(self):
+        tickets = self.all_tickets[~self.all_tickets['state'].isin(CLOSED_STATES)]
+        self.assertSameTotals(ticket_queries.open_totals(), tickets['group'].astype(object).value_counts(dropna=False))
+
+
+    def test_rollup_counts_tickets_without_group(self):
+        ticket_rollup.rebuild_rollup()
+        context = RefreshContext()
+        self.assertNotIn(ticket_rollup.NO_GROUP, context.groups)
+
+        tickets = pd.concat([self.all_tickets, self.archived_tickets], ignore_index=True)
+        tickets = tickets[tickets['state'] != "merged"]
+        opened = tickets['created_at'].dt.tz_convert(None).dt.to_period('M').value_counts()
+        monthly = context.sectors.monthly("diretoria")
+        self.assertEqual(monthly['opened'][monthly['opened'] > 0].to_dict(), opened.to_dict())
+        # os tickets 6, 9 e 12 não têm grupo
+        self.assertEqual(int(monthly['opened'].sum()), int(context.sectors.monthly("Triagem")['opened'].sum())
+                         + int(context.sectors.monthly("SIGAA")['opened'].sum()) + 3)
+
+    def test_rollup_update_of_ticket_without_group(self):
+        ticket_rollup.rebuild_rollup()
+        january = pd.Period('2022-01', freq='M')
+        before = RefreshContext().sectors.monthly("diretoria").loc[january]
+
+        state = TicketState.objects.get(name="closed").id
+        new_rows = pd.DataFrame([(None, state, datetime(2022, 1, 20, tzinfo=pytz.UTC),
+                                  datetime(2022, 1, 22, tzinfo=pytz.UTC))], columns=ticket_rollup.TICKET_COLUMNS)
+        ticket_rollup.update_rollup(new_rows.iloc[:0], new_rows)
+
+        after = RefreshContext().sectors.monthly("diretoria").loc[january]
+        self.assertEqual((after - before).to_dict(), {'opened': 1, 'closed': 1, 'leadtime_sum': 2, 'leadtime_count': 1})
+
+class MonthEndBacklogTest(TestCase):
+    """
+    Check that only the months without backlog snapshot come from the state history.
+    """
+
+    def setUp(self):
+        group = TicketGroup.objects.create(name="SIGAA")
+        states = {name: TicketState.objects.create(name=name) for name in ["new", "open", "closed"]}
+        tickets = [
+            # número, estado, criação, fechamento e transições
+            (1, "closed", datetime(2022, 1, 5), datetime(2022, 1, 20),
+             [(datetime(2022, 1, 6), "new", "open"), (datetime(2022, 1, 20), "open", "closed")]),
+            (2, "open", datetime(2022, 1, 10), None, [(datetime(2022, 1, 11), "new", "open")]),
+            (3, "closed", datetime(2022, 3, 5), datetime(2022, 4, 2),
+             [(datetime(2022, 3, 6), "new", "open"), (datetime(2022, 4, 2), "open", "closed")]),
+            (4, "open", datetime(2022, 4, 10), None, [(datetime(2022, 4, 11), "new", "open")]),
+        ]
+        history_id = 0
+        for number, state, created_at, close_at, changes in tickets:
+            ticket = Ticket.objects.create(id_ticket=number, number=number, title="", group=group, state=states[state],
+                                           created_at=created_at.replace(tzinfo=pytz.UTC),
+                                           close_at=close_at and close_at.replace(tzinfo=pytz.UTC))
+            for changed_at, from_state, to_state in changes:
+                history_id += 1
+                TicketStateChange.objects.create(ticket=ticket, history_id=history_id, from_state=from_state,
+                                                 to_state=to_state, changed_at=changed_at.replace(tzinfo=pytz.UTC))
+        # os snapshots de fevereiro e março faltam
+        for date, amount in [(datetime(2022, 1, 31), 7), (datetime(2022, 4, 30), 5)]:
+            BacklogSnapshot.objects.create(date=date.date(), group=group, state=states["open"], amount=amount)
+        self.months = list(pd.period_range('2022-01', '2022-05', freq='M'))
+
+    def test_missing_months_come_from_the_history(self):
+        backlog = RefreshContext().sectors.backlog("SIGAA", self.months)
+        self.assertEqual(backlog, [7, 1, 2, 5, 2])
+
+    def test_history_only_loads_tickets_that_may_be_open(self):
+        tickets, changes = load_state_history(since=datetime(2022, 2, 28, tzinfo=pytz.UTC),
+                                              until=datetime(2022, 4, 1, tzinfo=pytz.UTC))
+        numbers = dict(Ticket.objects.values_list('id', 'number'))
+        self.assertEqual(sorted(tickets['id'].map(numbers)), [2, 3])
+        self.assertEqual(sorted(changes['ticket_id'].map(numbers).unique()), [2, 3])
+
+    def test_view_without_transitions_keeps_the_rollup(self):
+        TicketStateChange.objects.all().delete()
+        self.assertIsNone(RefreshContext().sectors.backlog("SIGAA", self.months))
+
+
+class SectorLeadtimeTest(TestCase):
+    """
+    Pin the monthly leadtime of the sectors, read from the rollup.
+
+    The leadtime of a month is the mean of the whole days of the
+    tickets closed in it, truncated, not the truncated mean of
+    their hours, as the old chart of the Diretoria.
+    """
+
+    def setUp(self):
+        groups = {name: TicketGroup.objects.create(name=name) for name in ["Conectividade", "SIGAA", "SIPAC", "UABJ"]}
+        states = {name: TicketState.objects.create(name=name) for name in ["open", "closed", "merged"]}
+        tickets = [
+            # grupo, estado, criação e fechamento
+            # 46 e 71 horas, 1 e 2 dias: a média é 1 dia, a média das horas seria 2 dias
+            ("Conectividade", "closed", datetime(2022, 3, 1), datetime(2022, 3, 2, 22)),
+            ("Conectividade", "closed", datetime(2022, 3, 5), datetime(2022, 3, 7, 23)),
+            ("Conectividade", "merged", datetime(2022, 3, 1), datetime(2022, 3, 20)),
+            # reaberto, o fechamento conta, mas não o leadtime
+            ("Conectividade", "open", datetime(2022, 4, 1), datetime(2022, 4, 25)),
+            ("SIGAA", "closed", datetime(2022, 3, 1), datetime(2022, 3, 11)),
+            ("SIPAC", "closed", datetime(2022, 2, 20), datetime(2022, 3, 4)),
+            ("SIGAA", "closed", datetime(2022, 4, 1), datetime(2022, 4, 4, 12)),
+            # antes do primeiro mês
+            ("UABJ", "closed", datetime(2022, 1, 10), datetime(2022, 1, 15)),
+            ("UABJ", "closed", datetime(2022, 4, 10), datetime(2022, 4, 30)),
+        ]
+        for number, (group, state, created_at, close_at) in enumerate(tickets, start=1):
+            Ticket.objects.create(id_ticket=number, number=number, title="", group=groups[group], state=states[state],
+                                  created_at=created_at.replace(tzinfo=pytz.UTC), close_at=close_at.replace(tzinfo=pytz.UTC))
+        ticket_rollup.rebuild_rollup()
+
+    def test_leadtime(self):
+        leadtime = RefreshContext().sectors.leadtime(["conectividade", "sistemas", "UABJ"], pd.Period('2022-02', freq='M'))
+        expected = pd.DataFrame({"conectividade": [1, 0], "sistemas": [11, 3], "UABJ": [0, 20]},
+                                index=pd.period_range('2022-03', '2022-04', freq='M', name='month'))
+        self.assertEqual(leadtime.to_dict(), expected.to_dict())
+        self.assertEqual(list(leadtime.columns), list(expected.columns))
+
+def utc(*args):
+    return pd.Timestamp(datetime(*args), tz='UTC')
+
+
+class StateHistoryTest(SimpleTestCase):
+    """
+    Check the state periods and the daily backlog built from the transitions.
+    """
+
+    def setUp(self):
+        self.tickets = pd.DataFrame([
+            # nunca mudou de estado
+            (1, utc(2022, 1, 1, 8), 'open', 'SIGAA'),
+            # aberto, fechado e reaberto, com as transições fora de ordem
+            (2, utc(2022, 1, 2, 9), 'open', 'SIGAA'),
+            # aberto e fechado no mesmo dia
+            (3, utc(2022, 1, 3, 10), 'closed', 'Triagem'),
+        ], columns=['id', 'created_at', 'state', 'group'])
+        self.changes = pd.DataFrame([
+            (2, utc(2022, 1, 6, 12), 'closed', 'open'),
+            (2, utc(2022, 1, 4, 12), 'new', 'closed'),
+            (3, utc(2022, 1, 3, 18), 'new', 'closed'),
+            # transição de um ticket que não foi carregado
+            (9, utc(2022, 1, 2), 'new', 'open'),
+        ], columns=['ticket_id', 'changed_at', 'from_state', 'to_state'])
+
+    def test_state_intervals(self):
+        intervals = state_intervals(self.tickets, self.changes)
+        expected = pd.DataFrame([
+            (1, 'open', utc(2022, 1, 1, 8), pd.NaT),
+            (2, 'new', utc(2022, 1, 2, 9), utc(2022, 1, 4, 12)),
+            (2, 'closed', utc(2022, 1, 4, 12), utc(2022, 1, 6, 12)),
+            (2, 'open', utc(2022, 1, 6, 12), pd.NaT),
+            (3, 'new', utc(2022, 1, 3, 10), utc(2022, 1, 3, 18)),
+            (3, 'closed', utc(2022, 1, 3, 18), pd.NaT),
+        ], columns=['ticket_id', 'state', 'start', 'end'])
+        expected['end'] = pd.to_datetime(expected['end'], utc=True)
+        self.assertTrue(intervals[expected.columns].equals(expected), f"\n{intervals}")
+
+    def test_daily_backlog_by(self):
+        intervals = state_intervals(self.tickets, self.changes)
+        intervals['group'] = intervals['ticket_id'].map(self.tickets.set_index('id')['group'])
+        backlog = daily_backlog_by(intervals, ['group'], utc(2022, 1, 7, 15))
+        amounts = {(date.day, group): amount for date, group, amount in backlog.itertuples(index=False)}
+        # o ticket 2 sai do backlog no dia em que fecha e volta no dia em que reabre,
+        # o ticket 3 abre e fecha no mesmo dia e nunca entra
+        self.assertEqual(amounts, {(1, 'SIGAA'): 1, (2, 'SIGAA'): 2, (3, 'SIGAA'): 2, (4, 'SIGAA'): 1,
+                                   (5, 'SIGAA'): 1, (6, 'SIGAA'): 2, (7, 'SIGAA'): 2})
+
+    def test_daily_backlog_by_without_open_periods(self):
+        intervals = state_intervals(self.tickets[self.tickets['id'] == 3], self.changes)
+        intervals = intervals[intervals['state'] == 'closed'].assign(group='Triagem')
+        backlog = daily_backlog_by(intervals, ['group'])
+        self.assertTrue(backlog.empty)
+        self.assertEqual(list(backlog.columns), ['date', 'group', 'amount'])
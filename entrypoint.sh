@@ -54,4 +54,13 @@ python manage.py makemigrations
 python manage.py migrate django_plotly_dash --noinput
 python manage.py migrate
 
+# recalcula os totais mensais dos tickets
+python manage.py rebuild_rollup
+
+# monta os snapshots diários do backlog na primeira subida, os próximos são tirados pelo scheduler
+python manage.py backfill_backlog --if-empty
+
+# sincronização com o zammad, só um processo do cluster executa os jobs
+python manage.py run_scheduler &
+
 gunicorn dsc_dashboard.wsgi:application --bind 0.0.0.0:8000
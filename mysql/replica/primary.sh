@@ -0,0 +1,3 @@
+#!/bin/bash
+# permite ao usuário do dashboard ler o atraso da réplica (SHOW REPLICA STATUS)
+mysql -u root --password="$MYSQL_ROOT_PASSWORD" -e "GRANT REPLICATION CLIENT ON *.* TO '$MYSQL_USER'@'%';"
@@ -0,0 +1,10 @@
+#!/bin/bash
+# replica o banco principal a partir do início do binlog, usando os GTIDs
+mysql -u root --password="$MYSQL_ROOT_PASSWORD" -e "
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST='$MYSQL_SOURCE_HOST',
+    SOURCE_USER='root',
+    SOURCE_PASSWORD='$MYSQL_ROOT_PASSWORD',
+    SOURCE_AUTO_POSITION=1,
+    GET_SOURCE_PUBLIC_KEY=1;
+START REPLICA;"